@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+import threading
+import wx
+from typed_view import TYPES, typed_chunks, aggregates
+
+
+class InspectCancelled(Exception):
+    pass
+
+
+class InspectWorker(object):
+    """ read a snapshot as typed values and compute their aggregates on a worker
+    thread, one array per piece of the snapshot so nothing is copied
+    """
+
+    def __init__(self, on_done=None, on_error=None):
+        self.done = False
+        self._on_done = on_done
+        self._on_error = on_error
+        self._cancel = threading.Event()
+        self._thread = None
+
+    def Start(self, span, type_name, big_endian, stride):
+        self._thread = threading.Thread(target=self._run, args=(span, type_name, big_endian, stride))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def Cancel(self, wait=True):
+        self._cancel.set()
+        if wait and self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def Progress(self, done, total):
+        if self._cancel.is_set():
+            raise InspectCancelled()
+
+    def _post(self, callback, *args):
+        if callback and not self._cancel.is_set():
+            callback(*args)
+
+    def _run(self, span, type_name, big_endian, stride):
+        try:
+            values = typed_chunks(span.iter_chunks(), len(span), type_name, big_endian, stride)
+            result = aggregates(values, self.Progress)
+            wx.CallAfter(self._post, self._on_done, values, result)
+        except InspectCancelled:
+            pass
+        except Exception as e:
+            wx.CallAfter(self._post, self._on_error, e)
+        self.done = True
+
+
+class ValueList(wx.ListCtrl):
+    """ virtual list of typed values, only the visible rows are formatted """
+
+    def __init__(self, parent):
+        wx.ListCtrl.__init__(self, parent, -1, style=wx.LC_REPORT | wx.LC_VIRTUAL | wx.LC_SINGLE_SEL)
+        self.InsertColumn(0, "Index", width=80)
+        self.InsertColumn(1, "Address", width=110)
+        self.InsertColumn(2, "Value", width=200)
+        self.values = ()
+        self.start = 0
+        self.stride = 1
+
+    def SetValues(self, values, start, stride):
+        self.values = values
+        self.start = start
+        self.stride = stride
+        self.SetItemCount(len(values))
+        self.Refresh()
+
+    def OnGetItemText(self, item, col):
+        if col == 0:
+            return str(item)
+        elif col == 1:
+            return "0x%X" % (self.start + item * self.stride)
+        value = self.values[item]
+        return repr(value.item() if hasattr(value, "item") else value)
+
+
+class ArrayInspector(wx.Frame):
+    """ the selection of an editor (from the cursor to the end without one) read
+    as an array of numbers, the values are views over the pieces of the buffer,
+    not a copy, and they are summed on a worker thread
+    """
+    DELAY = 300  # ms between the last edit and the refresh
+
+    def __init__(self, editor):
+        wx.Frame.__init__(self, editor, -1, "Array Inspector", size=(460, 520),
+                          style=wx.DEFAULT_FRAME_STYLE | wx.FRAME_TOOL_WINDOW | wx.FRAME_FLOAT_ON_PARENT)
+        self._editor = editor
+        self._document = None
+        self._timer = None
+        self._worker = None
+        self._start = 0
+
+        panel = wx.Panel(self)
+        sizer = wx.BoxSizer(wx.VERTICAL)
+        options = wx.BoxSizer(wx.HORIZONTAL)
+        self._type = wx.Choice(panel, -1, choices=[name for name, code in TYPES])
+        self._type.SetStringSelection("int16")
+        self._endian = wx.Choice(panel, -1, choices=["Little endian", "Big endian"])
+        self._endian.SetSelection(0)
+        self._stride = wx.SpinCtrl(panel, -1, "0", min=0, max=0x10000, size=(70, -1))
+        self._stride.SetToolTip("Bytes from one value to the next, 0 for packed values")
+        options.Add(self._type, 0, wx.RIGHT, 4)
+        options.Add(self._endian, 0, wx.RIGHT, 4)
+        options.Add(wx.StaticText(panel, -1, "Stride"), 0, wx.ALIGN_CENTER_VERTICAL | wx.RIGHT, 4)
+        options.Add(self._stride, 0)
+        sizer.Add(options, 0, wx.ALL, 4)
+
+        self._summary = wx.StaticText(panel, -1, "")
+        sizer.Add(self._summary, 0, wx.EXPAND | wx.ALL, 4)
+        self._list = ValueList(panel)
+        self._list.Bind(wx.EVT_LIST_ITEM_ACTIVATED, self.OnItemActivated)
+        sizer.Add(self._list, 1, wx.EXPAND | wx.ALL, 4)
+        panel.SetSizer(sizer)
+
+        for ctrl, event in ((self._type, wx.EVT_CHOICE), (self._endian, wx.EVT_CHOICE),
+                            (self._stride, wx.EVT_SPINCTRL)):
+            ctrl.Bind(event, lambda e: self.Inspect())
+        self.Bind(wx.EVT_CLOSE, self.OnClose)
+
+    def _bind(self, document):
+        if document is self._document:
+            return
+        if self._document is not None:
+            self._document.RemoveListener(self._on_edit)
+        self._document = document
+        document.AddListener(self._on_edit)
+
+    def _on_edit(self, start, removed, inserted):
+        self.Release()
+        self.ScheduleInspect()
+
+    def ScheduleInspect(self):
+        if self._timer is not None and self._timer.IsRunning():
+            self._timer.Restart(self.DELAY)
+        else:
+            self._timer = wx.CallLater(self.DELAY, self.Inspect)
+
+    def Release(self):
+        """ drop the views over the buffer, a closing document can then release its file """
+        if self._worker is not None:
+            self._worker.Cancel()
+            self._worker = None
+        self._list.SetValues((), 0, 1)
+
+    def Inspect(self):
+        table = self._editor.grid.GetTable()
+        self._bind(table.document)
+        buffer = table.GetBuffer()
+        selection = self._editor.Selection
+        if selection:
+            start, length = selection
+        else:
+            start = self._editor.CurrentAddr
+            length = len(buffer) - start
+
+        self.Release()
+        self._start = start
+        self._summary.SetLabel("Reading 0x%X bytes at 0x%X..." % (length, start))
+        self._worker = InspectWorker(on_done=self.OnInspected, on_error=self.OnError)
+        self._worker.Start(buffer.snapshot(start, start + length), self._type.GetStringSelection(),
+                           self._endian.GetSelection() == 1, self._stride.GetValue())
+
+    def OnInspected(self, values, result):
+        self._worker = None
+        self._list.SetValues(values, self._start, self._stride.GetValue() or values.itemsize)
+        if result is None:
+            self._summary.SetLabel("No values")
+        else:
+            low, high, total, mean = result
+            self._summary.SetLabel("%d values  min %s  max %s  sum %s  mean %.6g"
+                                   % (len(values), low, high, total, mean))
+
+    def OnError(self, error):
+        self._worker = None
+        self._summary.SetLabel("Error: %s" % error)
+
+    def OnItemActivated(self, event):
+        """ select the bytes of the value in the editor """
+        item = event.GetIndex()
+        self._editor.SetSelection(self._list.start + item * self._list.stride, self._list.values.itemsize, True)
+
+    def OnClose(self, event):
+        if self._timer is not None:
+            self._timer.Stop()
+        self.Release()
+        if self._document is not None:
+            self._document.RemoveListener(self._on_edit)
+            self._document = None
+        event.Skip()
@@ -0,0 +1,257 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" headless benchmarks of the editor operations
+
+    python benchmark.py                                  # 1M, 64M and 1G files
+    python benchmark.py --sizes 1M,64M -o new.json
+    python benchmark.py --sizes 1M -o new.json --compare old.json
+
+The test files are generated from a fixed seed into --data-dir and reused by
+later runs. GetValue and GetAttr go through HexGridTable when a wx display is
+available, otherwise GetValue is timed on the row cache alone and GetAttr is
+skipped.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+from hex_document import HexDocument
+from row_cache import RowCache
+from search_types import SEARCH_TYPES
+
+SIZES = {"1M": 0x100000, "64M": 0x4000000, "1G": 0x40000000}
+SEED = 0x4845
+BLOCK_SIZE = 0x100000
+SCREEN_ROWS = 48
+PLANTED = [b"\xde\xad\xbe\xef", b"\xca\xfe\xba\xbe", b"HexEditor0042"]
+SEARCHES = {
+    SEARCH_TYPES.Hexadecimal: "DEADBEEF",
+    SEARCH_TYPES.NormalText: "HexEditor",
+    SEARCH_TYPES.RegexText: r"HexEditor[0-9]{4}",
+    SEARCH_TYPES.SignatureList: "DEADBEEF, CAFEBABE, 0BADF00D",
+}
+
+
+def make_file(path, size):
+    """ seeded random blocks, each rotated so the file does not repeat every block,
+    with the searched patterns planted every 64 KB
+    """
+    rand = random.Random(SEED)
+    block = rand.randbytes(BLOCK_SIZE)
+    with open(path, "wb") as output:
+        written = 0
+        index = 0
+        while written < size:
+            shift = (index * 4099) % BLOCK_SIZE
+            data = bytearray(block[shift:] + block[:shift])
+            for offset in range(0, BLOCK_SIZE, 0x10000):
+                pattern = PLANTED[(offset // 0x10000) % len(PLANTED)]
+                data[offset + 0x100:offset + 0x100 + len(pattern)] = pattern
+            count = min(BLOCK_SIZE, size - written)
+            output.write(data[:count])
+            written += count
+            index += 1
+
+
+def measure(func, repeat):
+    """ return the timings of repeat calls of func() in seconds """
+    times = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def summary(times, **extra):
+    times = sorted(times)
+    result = {
+        "runs": len(times),
+        "min": times[0],
+        "median": times[len(times) // 2],
+        "max": times[-1],
+    }
+    result.update(extra)
+    return result
+
+
+_app = None
+
+
+def make_view(document, use_wx):
+    """ return (table or None, get_value(row, col)) """
+    global _app
+    if use_wx:
+        try:
+            import wx
+            from hex_grid_table import HexGridTable
+            if wx.GetApp() is None:
+                _app = wx.App(False)  # exits without a display
+            table = HexGridTable(document=document)
+            return table, table.GetValue
+        except (Exception, SystemExit):
+            pass
+    cache = RowCache(document.buffer.read)
+
+    def get_value(row, col):
+        cells, dump = cache.Get(row)
+        return dump if col == 16 else cells[col] if col < len(cells) else ""
+
+    get_value.cache = cache
+    return None, get_value
+
+
+def run_size(path, repeat, use_wx):
+    results = {}
+    size = os.path.getsize(path)
+
+    def load():
+        HexDocument.FromFile(path).Close()
+
+    results["load"] = summary(measure(load, repeat))
+
+    document = HexDocument.FromFile(path)
+    table, get_value = make_view(document, use_wx)
+    results["view"] = "HexGridTable" if table is not None else "RowCache"
+
+    rows = (size + 15) // 16
+    screens = [0, rows // 2, max(rows - SCREEN_ROWS, 0)]
+
+    def clear_rows():
+        if table is not None:
+            table._row_cache.Clear()
+        else:
+            get_value.cache.Clear()
+
+    def screen_values():
+        for first in screens:
+            for row in range(first, first + SCREEN_ROWS):
+                for col in range(17):
+                    get_value(row, col)
+
+    def cold_screen_values():
+        clear_rows()
+        screen_values()
+
+    cells = len(screens) * SCREEN_ROWS * 17
+    results["GetValue cold screen"] = summary(measure(cold_screen_values, repeat), cells=cells)
+    results["GetValue warm screen"] = summary(measure(screen_values, repeat), cells=cells)
+
+    if table is not None:
+        def screen_attrs():
+            for first in screens:
+                for row in range(first, first + SCREEN_ROWS):
+                    for col in range(17):
+                        attr = table.GetAttr(row, col)
+                        if attr:
+                            attr.DecRef()
+
+        results["GetAttr screen"] = summary(measure(screen_attrs, repeat), cells=cells)
+    else:
+        results["GetAttr screen"] = {"skipped": "no wx display"}
+
+    data = b"\x5a" * 16
+    for where, pos in (("start", 0), ("middle", size // 2), ("end", size)):
+        results["InsertRange %s" % where] = summary(measure(lambda: document.InsertRange(pos, data), repeat))
+        results["DeleteRange %s" % where] = summary(measure(lambda: document.DeleteRange(pos, len(data)), repeat))
+        results["Undo %s" % where] = summary(measure(document.Undo, repeat))
+        results["Redo %s" % where] = summary(measure(document.Redo, repeat))
+        # back to the original bytes for the next position
+        while document.CanUndo:
+            document.Undo()
+
+    for find_type in SEARCH_TYPES.Values():
+        text = SEARCHES[find_type]
+        hits = []
+
+        def find():
+            hits[:] = [len(list(document.FindIter(text, find_type)))]
+
+        results["FindIter %s" % find_type] = summary(measure(find, repeat), hits=hits[0])
+
+    fd, temp_path = tempfile.mkstemp(prefix="hexeditor-bench-")
+    os.close(fd)
+    try:
+        def save():
+            with open(temp_path, "wb") as output:
+                document.SaveFile(output)
+
+        results["SaveFile"] = summary(measure(save, repeat), bytes=size)
+    finally:
+        os.remove(temp_path)
+
+    if table is not None:
+        table.Close()
+    else:
+        document.Close()
+    return results
+
+
+def compare(results, baseline):
+    """ print the median of every operation next to the baseline run """
+    for label, ops in results["sizes"].items():
+        old_ops = baseline.get("sizes", {}).get(label, {})
+        print("== %s" % label)
+        for name, result in ops.items():
+            old = old_ops.get(name)
+            if not isinstance(result, dict) or "median" not in result:
+                continue
+            if isinstance(old, dict) and "median" in old and old["median"]:
+                ratio = result["median"] / old["median"]
+                print("  %-32s %10.6f s  %10.6f s  x%.2f" % (name, result["median"], old["median"], ratio))
+            else:
+                print("  %-32s %10.6f s" % (name, result["median"]))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="HexEditor benchmarks")
+    parser.add_argument("--sizes", default="1M,64M,1G", help="comma separated, of %s" % ", ".join(SIZES))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "hexeditor-bench"))
+    parser.add_argument("-o", "--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="JSON file of an earlier run")
+    parser.add_argument("--no-wx", action="store_true", help="do not time through HexGridTable")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.data_dir):
+        os.makedirs(args.data_dir)
+
+    results = {
+        "meta": {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+            "seed": SEED,
+        },
+        "sizes": {},
+    }
+    for label in args.sizes.split(","):
+        label = label.strip()
+        if label not in SIZES:
+            parser.error("unknown size %s" % label)
+        path = os.path.join(args.data_dir, "bench-%s.bin" % label)
+        if not os.path.isfile(path) or os.path.getsize(path) != SIZES[label]:
+            sys.stderr.write("generating %s\n" % path)
+            make_file(path, SIZES[label])
+        sys.stderr.write("running %s\n" % label)
+        results["sizes"][label] = run_size(path, args.repeat, not args.no_wx)
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as output:
+            output.write(text)
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as baseline:
+            compare(results, json.load(baseline))
+
+
+if __name__ == "__main__":
+    main()
@@ -10,4 +10,7 @@ class BinFileDropTarget(wx.FileDropTarget):
 
   def OnDropFiles(self, x, y, filenames):
     filenames = [path for path in filenames if os.path.isfile(path)]
-    self.editor.LoadFile(filenames[0])
+    if not filenames:
+      return False
+    self.editor.OpenFiles(filenames)
+    return True
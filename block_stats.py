@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+import math
+from itertools import islice
+from file_compare import iter_blocks
+try:
+    import numpy as np
+except ImportError:
+    np = None  # histograms with bytes.count, much slower on large files
+
+STATS_BLOCK = 0x10000
+TEXT_BYTES = bytes([0x09, 0x0A, 0x0D]) + bytes(range(0x20, 0x7F))
+
+
+def _histogram(block):
+    if np is not None:
+        return np.bincount(np.frombuffer(block, np.uint8), minlength=256)
+    data = bytes(block)
+    return [data.count(value) for value in range(256)]
+
+
+def block_summary(block):
+    """ return (entropy in bits per byte, zero byte ratio, text byte ratio) of a block """
+    total = len(block)
+    if not total:
+        return 0.0, 0.0, 0.0
+    counts = _histogram(block)
+    if np is not None:
+        p = counts[counts > 0] / float(total)
+        entropy = float(-(p * np.log2(p)).sum())
+        text = int(counts[list(TEXT_BYTES)].sum())
+    else:
+        entropy = -sum(c / float(total) * math.log(c / float(total), 2) for c in counts if c)
+        text = sum(counts[value] for value in TEXT_BYTES)
+    return entropy, int(counts[0]) / float(total), text / float(total)
+
+
+class BlockStats(object):
+    """ entropy and byte class ratios of every block of a buffer, a block is only
+    read again when an edit touched it, an insert or delete moves every later block
+    """
+
+    def __init__(self, block_size=STATS_BLOCK):
+        self.block_size = block_size
+        self.entropy = []
+        self.zeros = []
+        self.text = []
+        self._valid = []
+
+    def __len__(self):
+        return len(self._valid)
+
+    def IsValid(self, index):
+        return self._valid[index]
+
+    def Invalidate(self, start, removed, inserted):
+        """ removed bytes at start were replaced by inserted bytes """
+        first = start // self.block_size
+        if removed == inserted:
+            last = (start + removed - 1) // self.block_size if removed else first
+            for index in range(first, min(last + 1, len(self._valid))):
+                self._valid[index] = False
+        else:
+            for index in range(first, len(self._valid)):
+                self._valid[index] = False
+
+    def Resize(self, length):
+        """ one entry per block of a buffer of length bytes, new blocks are stale """
+        count = (length + self.block_size - 1) // self.block_size
+        for values in (self.entropy, self.zeros, self.text, self._valid):
+            del values[count:]
+        grow = count - len(self._valid)
+        self.entropy.extend([0.0] * grow)
+        self.zeros.extend([0.0] * grow)
+        self.text.extend([0.0] * grow)
+        self._valid.extend([False] * grow)
+
+    def Update(self, span, progress=None):
+        """ compute the stale blocks of span (a snapshot of the buffer),
+        progress(pos, total) is called after each block and may raise to stop
+        """
+        size = self.block_size
+        self.Resize(len(span))
+        count = len(self._valid)
+
+        index = 0
+        while index < count:
+            if self._valid[index]:
+                index += 1
+                continue
+            # read a run of stale blocks in one pass
+            end = index
+            while end < count and not self._valid[end]:
+                end += 1
+            for block in islice(iter_blocks(span, size, index * size), end - index):
+                self.entropy[index], self.zeros[index], self.text[index] = block_summary(block)
+                self._valid[index] = True
+                index += 1
+                if progress:
+                    progress(min(index * size, len(span)), len(span))
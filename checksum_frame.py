@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+import time
+import threading
+import wx
+from hash_tree import HashTree, digest_span
+
+
+class HashCancelled(Exception):
+    pass
+
+
+class HashWorker(object):
+    """ hash a snapshot on a worker thread, the whole buffer through a HashTree
+    (crc32 first, it only reads stale blocks) or a selection in one pass
+    """
+    PROGRESS_INTERVAL = 0.1
+
+    def __init__(self, on_crc=None, on_digests=None, on_progress=None, on_error=None):
+        self.error = None
+        self.done = False
+        self._on_crc = on_crc
+        self._on_digests = on_digests
+        self._on_progress = on_progress
+        self._on_error = on_error
+        self._cancel = threading.Event()
+        self._thread = None
+        self._last_progress = 0
+
+    def Start(self, span, tree=None):
+        self._thread = threading.Thread(target=self._run, args=(span, tree))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def Cancel(self, wait=True):
+        self._cancel.set()
+        if wait and self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def Progress(self, pos, total):
+        if self._cancel.is_set():
+            raise HashCancelled()
+        now = time.time()
+        if self._on_progress and now - self._last_progress >= self.PROGRESS_INTERVAL:
+            self._last_progress = now
+            wx.CallAfter(self._post, self._on_progress, pos, total)
+
+    def _post(self, callback, *args):
+        if not self._cancel.is_set():
+            callback(*args)
+
+    def _run(self, span, tree):
+        try:
+            if tree is not None:
+                crc = tree.Crc32(span, self.Progress)
+                wx.CallAfter(self._post, self._on_crc, crc)
+                md5, sha256 = tree.Digests(span, self.Progress)
+            else:
+                crc, md5, sha256 = digest_span(span, self.Progress)
+                wx.CallAfter(self._post, self._on_crc, crc)
+            wx.CallAfter(self._post, self._on_digests, md5, sha256)
+        except HashCancelled:
+            pass
+        except Exception as e:
+            self.error = e
+            wx.CallAfter(self._post, self._on_error, e)
+        self.done = True
+
+
+class ChecksumFrame(wx.Frame):
+    """ CRC32, MD5 and SHA-256 of the whole buffer or of the selection of an editor,
+    recomputed shortly after each edit
+    """
+    DELAY = 300  # ms between the last edit and the rehash
+
+    def __init__(self, editor):
+        wx.Frame.__init__(self, editor, -1, "Checksums", size=(560, 190),
+                          style=wx.DEFAULT_FRAME_STYLE | wx.FRAME_TOOL_WINDOW | wx.FRAME_FLOAT_ON_PARENT)
+        self._editor = editor
+        self._document = None
+        self._tree = None
+        self._worker = None
+        self._timer = None
+        self._scope_text = ""
+
+        panel = wx.Panel(self)
+        sizer = wx.BoxSizer(wx.VERTICAL)
+        self._scope = wx.RadioBox(panel, -1, "", choices=["Whole buffer", "Selection"])
+        self._scope.Bind(wx.EVT_RADIOBOX, lambda e: self.Recompute())
+        sizer.Add(self._scope, 0, wx.ALL, 4)
+
+        grid = wx.FlexGridSizer(3, 2, 4, 8)
+        grid.AddGrowableCol(1)
+        self._values = {}
+        for name in ("CRC32", "MD5", "SHA-256"):
+            grid.Add(wx.StaticText(panel, -1, name), 0, wx.ALIGN_CENTER_VERTICAL)
+            text = wx.TextCtrl(panel, -1, "", style=wx.TE_READONLY)
+            grid.Add(text, 1, wx.EXPAND)
+            self._values[name] = text
+        sizer.Add(grid, 1, wx.EXPAND | wx.ALL, 4)
+
+        self._status = wx.StaticText(panel, -1, "")
+        sizer.Add(self._status, 0, wx.ALL, 4)
+        panel.SetSizer(sizer)
+
+        self.Bind(wx.EVT_CLOSE, self.OnClose)
+
+    @property
+    def SelectionOnly(self):
+        return self._scope.GetSelection() == 1
+
+    def _bind(self, document):
+        """ follow the edits of the document of the editor, a new document starts a new tree """
+        if document is self._document:
+            return
+        if self._document is not None:
+            self._document.RemoveListener(self._on_edit)
+        self._document = document
+        self._tree = HashTree()
+        document.AddListener(self._on_edit)
+
+    def _on_edit(self, start, removed, inserted):
+        self.Stop()
+        self._tree.Invalidate(start, removed, inserted)
+        self.ScheduleRecompute()
+
+    def ScheduleRecompute(self):
+        if self._timer is not None and self._timer.IsRunning():
+            self._timer.Restart(self.DELAY)
+        else:
+            self._timer = wx.CallLater(self.DELAY, self.Recompute)
+
+    def Stop(self):
+        if self._worker is not None:
+            self._worker.Cancel()
+            self._worker = None
+
+    def Recompute(self):
+        self.Stop()
+        table = self._editor.grid.GetTable()
+        self._bind(table.document)
+        buffer = table.GetBuffer()
+
+        if self.SelectionOnly:
+            selection = self._editor.Selection
+            start, length = selection if selection else (self._editor.CurrentAddr, 1)
+            span, tree = buffer.snapshot(start, start + length), None
+            scope = "0x%X bytes at 0x%X" % (length, start)
+        else:
+            span, tree = buffer.snapshot(), self._tree
+            scope = "0x%X bytes" % len(buffer)
+
+        for text in self._values.values():
+            text.SetValue("")
+        self._scope_text = scope
+        self._status.SetLabel("Hashing %s..." % scope)
+        self._worker = HashWorker(on_crc=self.OnCrc, on_digests=self.OnDigests,
+                                  on_progress=self.OnProgress, on_error=self.OnError)
+        self._worker.Start(span, tree)
+
+    def OnCrc(self, crc):
+        self._values["CRC32"].SetValue("%08X" % crc)
+
+    def OnDigests(self, md5, sha256):
+        self._values["MD5"].SetValue(md5.upper())
+        self._values["SHA-256"].SetValue(sha256.upper())
+        self._status.SetLabel(self._scope_text)
+
+    def OnProgress(self, pos, total):
+        percent = pos * 100 // total if total else 100
+        self._status.SetLabel("Hashing %s... %d%%" % (self._scope_text, percent))
+
+    def OnError(self, error):
+        self._status.SetLabel("Error: %s" % error)
+
+    def OnClose(self, event):
+        self.Stop()
+        if self._timer is not None:
+            self._timer.Stop()
+        if self._document is not None:
+            self._document.RemoveListener(self._on_edit)
+            self._document = None
+        event.Skip()  # destroyed by the default handler
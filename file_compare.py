@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+from interval_set import IntervalSet
+try:
+    import numpy as np
+except ImportError:
+    np = None  # plain python compare, slower on files with many differences
+
+COMPARE_BLOCK = 0x400000
+FALLBACK_BLOCK = 0x1000  # without numpy, blocks that differ are split down to this size
+
+
+class DiffIndex(IntervalSet):
+    """ differing ranges of a compare, filled by a SearchWorker from diff_ranges """
+    complete = False
+
+    def Add(self, start, end):
+        self.add(start, end)
+
+
+def iter_blocks(span, block_size=COMPARE_BLOCK, start=0):
+    """ yield memoryviews of block_size bytes from start over the chunks of span (a
+    Span or PieceTable), zero-copy inside a chunk, a block crossing two chunks is
+    copied into a scratch buffer that the next block reuses
+    """
+    scratch = bytearray(block_size)
+    fill = 0
+    for chunk in span.iter_chunks(start):
+        pos = 0
+        if fill:
+            count = min(block_size - fill, len(chunk))
+            scratch[fill:fill + count] = chunk[:count]
+            fill += count
+            pos = count
+            if fill < block_size:
+                continue
+            yield memoryview(scratch)
+            fill = 0
+        while len(chunk) - pos >= block_size:
+            yield chunk[pos:pos + block_size]
+            pos += block_size
+        if pos < len(chunk):
+            fill = len(chunk) - pos
+            scratch[:fill] = chunk[pos:]
+    if fill:
+        yield memoryview(scratch)[:fill]
+
+
+def _block_diff(a, b):
+    """ return [(start, end)] of the differing bytes of two views of one length """
+    if np is not None:
+        mask = np.frombuffer(a, np.uint8) != np.frombuffer(b, np.uint8)
+        if not mask.any():
+            return []
+        edges = np.flatnonzero(np.diff(mask, prepend=False, append=False))
+        return list(zip(edges[0::2].tolist(), edges[1::2].tolist()))
+
+    if a.tobytes() == b.tobytes():
+        return []
+    ranges = []
+    for base in range(0, len(a), FALLBACK_BLOCK):
+        sub_a = a[base:base + FALLBACK_BLOCK].tobytes()
+        sub_b = b[base:base + FALLBACK_BLOCK].tobytes()
+        if sub_a == sub_b:
+            continue
+        for i in range(len(sub_a)):
+            if sub_a[i] != sub_b[i]:
+                if ranges and ranges[-1][1] == base + i:
+                    ranges[-1] = (ranges[-1][0], base + i + 1)
+                else:
+                    ranges.append((base + i, base + i + 1))
+    return ranges
+
+
+def diff_ranges(a, b, block_size=COMPARE_BLOCK, progress=None):
+    """ yield the (start, end) ranges where a and b (Spans or PieceTables) differ,
+    bytes past the end of the shorter one all differ, the blocks are compared
+    with numpy when it is installed, progress(pos, total) is called after each block
+    """
+    total = max(len(a), len(b))
+    common = min(len(a), len(b))
+    pending = None
+    pos = 0
+    for block_a, block_b in zip(iter_blocks(a, block_size), iter_blocks(b, block_size)):
+        length = min(len(block_a), len(block_b), common - pos)
+        for start, end in _block_diff(block_a[:length], block_b[:length]):
+            start += pos
+            end += pos
+            if pending is not None and pending[1] == start:
+                pending = (pending[0], end)  # a range running over the block boundary
+                continue
+            if pending is not None:
+                yield pending
+            pending = (start, end)
+        pos += length
+        if progress:
+            progress(pos, total)
+        if pos >= common:
+            break
+    if common < total:
+        if pending is not None and pending[1] == common:
+            pending = (pending[0], total)
+        else:
+            if pending is not None:
+                yield pending
+            pending = (common, total)
+    if pending is not None:
+        yield pending
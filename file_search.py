@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+import os
+from hex_document import HexDocument
+from search_types import SEARCH_TYPES
+from hex_text import search_text
+
+MAX_HITS = 1000  # hits kept per file, the rest are only counted
+
+
+def check_pattern(text, find_type=SEARCH_TYPES.Hexadecimal):
+    """ raise when text is not a valid search of find_type, before any file is read """
+    list(HexDocument(b"").FindIter(search_text(text, find_type), find_type))
+
+
+def collect_files(paths):
+    """ return the files of paths, a directory stands for every file below it """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, names in os.walk(path):
+                dirs.sort()
+                files.extend(os.path.join(root, name) for name in sorted(names)
+                             if os.path.isfile(os.path.join(root, name)))
+        elif os.path.isfile(path):
+            files.append(path)
+    return files
+
+
+def search_file(path, text, find_type=SEARCH_TYPES.Hexadecimal, max_hits=MAX_HITS):
+    """ return (path, hits, count), the first max_hits (start, end) of the search
+    in the file and the number of hits, the file is mapped, not read
+
+    Runs in a worker process, it gets the pattern as text so nothing but strings
+    cross the process boundary.
+    """
+    text = search_text(text, find_type)
+    document = HexDocument.FromFile(path)
+    try:
+        hits = []
+        count = 0
+        for hit in document.FindIter(text, find_type):
+            if count < max_hits:
+                hits.append(hit)
+            count += 1
+        return path, hits, count
+    finally:
+        document.Close()
@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import wx
+from search_types import SEARCH_TYPES
+from bin_file_drop_target import BinFileDropTarget
+from file_search import check_pattern, collect_files, search_file
+
+
+class FileSearchWorker(object):
+    """ search many files at once, one file per task of a process pool, the
+    results are posted to the ui thread as the files are done
+    """
+    POLL_INTERVAL = 0.1  # s between two looks at the cancel flag
+
+    def __init__(self, on_result=None, on_progress=None, on_error=None, on_done=None):
+        self.done = False
+        self._on_result = on_result
+        self._on_progress = on_progress
+        self._on_error = on_error
+        self._on_done = on_done
+        self._cancel = threading.Event()
+        self._thread = None
+
+    def Start(self, files, text, find_type, workers=None):
+        self._thread = threading.Thread(target=self._run, args=(files, text, find_type, workers))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def Cancel(self, wait=False):
+        self._cancel.set()
+        if wait and self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def _post(self, callback, *args):
+        if callback and not self._cancel.is_set():
+            callback(*args)
+
+    def _run(self, files, text, find_type, workers):
+        # forking a process that runs a gui toolkit is not safe, the workers are spawned
+        context = multiprocessing.get_context("spawn")
+        executor = ProcessPoolExecutor(workers or os.cpu_count(), mp_context=context)
+        try:
+            pending = dict((executor.submit(search_file, path, text, find_type), path) for path in files)
+            finished = 0
+            while pending and not self._cancel.is_set():
+                done, not_done = wait(pending, self.POLL_INTERVAL, FIRST_COMPLETED)
+                for future in done:
+                    path = pending.pop(future)
+                    finished += 1
+                    try:
+                        path, hits, count = future.result()
+                    except Exception as e:
+                        wx.CallAfter(self._post, self._on_error, path, e)
+                        continue
+                    if count:
+                        wx.CallAfter(self._post, self._on_result, path, hits, count)
+                if done:
+                    wx.CallAfter(self._post, self._on_progress, finished, len(files))
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        self.done = True
+        wx.CallAfter(self._post, self._on_done)
+
+
+class ResultList(wx.ListCtrl):
+    """ virtual list of (path, start, end), one row per hit """
+
+    def __init__(self, parent):
+        wx.ListCtrl.__init__(self, parent, -1, style=wx.LC_REPORT | wx.LC_VIRTUAL | wx.LC_SINGLE_SEL)
+        self.InsertColumn(0, "File", width=360)
+        self.InsertColumn(1, "Address", width=110)
+        self.InsertColumn(2, "Length", width=70)
+        self.hits = []
+
+    def Clear(self):
+        self.hits = []
+        self.SetItemCount(0)
+        self.Refresh()
+
+    def AddHits(self, path, hits):
+        self.hits.extend((path, start, end) for start, end in hits)
+        self.SetItemCount(len(self.hits))
+
+    def OnGetItemText(self, item, col):
+        path, start, end = self.hits[item]
+        if col == 0:
+            return path
+        elif col == 1:
+            return "0x%X" % start
+        return str(end - start)
+
+
+class FileSearchFrame(wx.Frame):
+    """ find which files of a directory, or of the files dropped on the window,
+    contain a pattern, with the search types of the find bar
+    """
+
+    def __init__(self, editor):
+        wx.Frame.__init__(self, editor, -1, "Search in Files", size=(640, 480),
+                          style=wx.DEFAULT_FRAME_STYLE | wx.FRAME_TOOL_WINDOW | wx.FRAME_FLOAT_ON_PARENT)
+        self._editor = editor
+        self._worker = None
+        self._dropped = None  # files dropped on the window, searched instead of the directory
+        self._files = 0
+        self._matched = 0
+        self._total_hits = 0
+
+        panel = wx.Panel(self)
+        sizer = wx.BoxSizer(wx.VERTICAL)
+
+        where = wx.BoxSizer(wx.HORIZONTAL)
+        where.Add(wx.StaticText(panel, -1, "Look in"), 0, wx.ALIGN_CENTER_VERTICAL | wx.RIGHT, 4)
+        self._where = wx.TextCtrl(panel, -1, "")
+        self._where.Bind(wx.EVT_TEXT, self.OnWhereText)
+        where.Add(self._where, 1, wx.RIGHT, 4)
+        browse = wx.Button(panel, -1, "Browse...")
+        browse.Bind(wx.EVT_BUTTON, self.OnBrowse)
+        where.Add(browse, 0)
+        sizer.Add(where, 0, wx.EXPAND | wx.ALL, 4)
+
+        what = wx.BoxSizer(wx.HORIZONTAL)
+        self._text = wx.TextCtrl(panel, -1, "", style=wx.TE_PROCESS_ENTER)
+        self._text.Bind(wx.EVT_TEXT_ENTER, lambda e: self.Search())
+        what.Add(self._text, 1, wx.RIGHT, 4)
+        self._find_type = wx.Choice(panel, -1, choices=SEARCH_TYPES.Values())
+        self._find_type.SetStringSelection(SEARCH_TYPES.Hexadecimal)
+        what.Add(self._find_type, 0, wx.RIGHT, 4)
+        self._button = wx.Button(panel, -1, "Search")
+        self._button.Bind(wx.EVT_BUTTON, self.OnButton)
+        what.Add(self._button, 0)
+        sizer.Add(what, 0, wx.EXPAND | wx.ALL, 4)
+
+        self._list = ResultList(panel)
+        self._list.Bind(wx.EVT_LIST_ITEM_ACTIVATED, self.OnItemActivated)
+        sizer.Add(self._list, 1, wx.EXPAND | wx.ALL, 4)
+
+        self._status = wx.StaticText(panel, -1, "Drop files here or choose a directory")
+        sizer.Add(self._status, 0, wx.ALL, 4)
+        panel.SetSizer(sizer)
+
+        self.SetDropTarget(BinFileDropTarget(self))
+        self.Bind(wx.EVT_CLOSE, self.OnClose)
+
+    def OpenFiles(self, filenames):
+        """ called by the drop target, the dropped files are searched """
+        self._dropped = list(filenames)
+        self._where.ChangeValue("%d dropped files" % len(self._dropped))
+
+    def SetDirectory(self, path):
+        self._dropped = None
+        self._where.ChangeValue(path)
+
+    def OnWhereText(self, event):
+        self._dropped = None  # typing a path replaces the dropped files
+
+    def OnBrowse(self, event):
+        dlg = wx.DirDialog(self, "Search in", self._where.GetValue() if self._dropped is None else "")
+        if dlg.ShowModal() == wx.ID_OK:
+            self.SetDirectory(dlg.GetPath())
+        dlg.Destroy()
+
+    def OnButton(self, event):
+        if self._worker is not None and not self._worker.done:
+            self.Stop()
+            self._status.SetLabel("Search cancelled")
+        else:
+            self.Search()
+
+    def Stop(self):
+        if self._worker is not None:
+            self._worker.Cancel()
+            self._worker = None
+        self._button.SetLabel("Search")
+
+    def Search(self):
+        self.Stop()
+        text = self._text.GetValue()
+        find_type = self._find_type.GetStringSelection()
+        try:
+            check_pattern(text, find_type)
+        except Exception as e:
+            self._status.SetLabel("Invalid pattern: %s" % e)
+            return
+        files = collect_files(self._dropped if self._dropped is not None else [self._where.GetValue()])
+        if not files:
+            self._status.SetLabel("No files to search")
+            return
+
+        self._list.Clear()
+        self._files = len(files)
+        self._matched = 0
+        self._total_hits = 0
+        self._status.SetLabel("Searching %d files..." % len(files))
+        self._button.SetLabel("Stop")
+        self._worker = FileSearchWorker(on_result=self.OnResult, on_progress=self.OnProgress,
+                                        on_error=self.OnError, on_done=self.OnDone)
+        self._worker.Start(files, text, find_type)
+
+    def OnResult(self, path, hits, count):
+        self._matched += 1
+        self._total_hits += count
+        self._list.AddHits(path, hits)
+
+    def OnProgress(self, finished, total):
+        self._status.SetLabel("Searching... %d / %d files, %d hits in %d files"
+                              % (finished, total, self._total_hits, self._matched))
+
+    def OnError(self, path, error):
+        self._status.SetLabel("Can not search %s: %s" % (os.path.basename(path), error))
+
+    def OnDone(self):
+        self._button.SetLabel("Search")
+        self._status.SetLabel("%d hits in %d of %d files" % (self._total_hits, self._matched, self._files))
+
+    def OnItemActivated(self, event):
+        path, start, end = self._list.hits[event.GetIndex()]
+        self._editor.OpenFileAt(path, start, end - start)
+
+    def OnClose(self, event):
+        self.Stop()
+        event.Skip()
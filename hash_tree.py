@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+import zlib
+import hashlib
+from file_compare import iter_blocks
+
+HASH_BLOCK = 0x100000
+
+
+def crc32_shift_table(length):
+    """ the 32 columns of the linear map taking crc32(a) to the part of
+    crc32(a + b) that depends on a, for any b of length bytes
+    """
+    zeros = bytes(length)
+    base = zlib.crc32(zeros, 0)
+    return [zlib.crc32(zeros, 1 << bit) ^ base for bit in range(32)]
+
+
+def crc32_combine(crc1, crc2, table):
+    """ crc32 of a + b from crc32(a), crc32(b) and the shift table of len(b) """
+    result = crc2
+    bit = 0
+    while crc1:
+        if crc1 & 1:
+            result ^= table[bit]
+        crc1 >>= 1
+        bit += 1
+    return result
+
+
+class HashTree(object):
+    """ per-block hashes of a buffer kept across edits
+
+    CRC32 is cached per block and combined, so an edit only rehashes the blocks
+    it touched. MD5 and SHA-256 can not be combined, their states are saved at
+    every block start instead, hashing resumes from the first block an edit
+    touched. An insert or delete moves every later block, they are all dropped.
+    """
+
+    def __init__(self, block_size=HASH_BLOCK):
+        self.block_size = block_size
+        self._crcs = []  # crc32 of each block, None when stale
+        self._states = []  # (md5, sha256) before block i, valid for i < len(_states)
+        self._shift_tables = {}  # block length => crc32_shift_table
+
+    def Invalidate(self, start, removed, inserted):
+        """ removed bytes at start were replaced by inserted bytes """
+        first = start // self.block_size
+        del self._states[first + 1:]
+        if removed == inserted:
+            last = (start + removed - 1) // self.block_size if removed else first
+            for index in range(first, min(last + 1, len(self._crcs))):
+                self._crcs[index] = None
+        else:
+            del self._crcs[first:]
+
+    def Clear(self):
+        self._crcs = []
+        self._states = []
+
+    def _shift_table(self, length):
+        table = self._shift_tables.get(length)
+        if table is None:
+            table = self._shift_tables[length] = crc32_shift_table(length)
+        return table
+
+    def Crc32(self, span, progress=None):
+        """ crc32 of span (a snapshot of the buffer), only stale blocks are read,
+        progress(pos, total) is called after each block read and may raise to stop
+        """
+        size = self.block_size
+        count = (len(span) + size - 1) // size
+        del self._crcs[count:]
+        self._crcs.extend([None] * (count - len(self._crcs)))
+        for index, crc in enumerate(self._crcs):
+            if crc is None:
+                start = index * size
+                crc = 0
+                for chunk in span.iter_chunks(start, start + size):
+                    crc = zlib.crc32(chunk, crc)
+                self._crcs[index] = crc
+                if progress:
+                    progress(min(start + size, len(span)), len(span))
+
+        result = 0
+        for index, crc in enumerate(self._crcs):
+            length = min(size, len(span) - index * size)
+            result = crc if index == 0 else crc32_combine(result, crc, self._shift_table(length))
+        return result
+
+    def Digests(self, span, progress=None):
+        """ return (md5, sha256) hex digests of span, resuming from the saved state
+        of the first stale block
+        """
+        size = self.block_size
+        count = (len(span) + size - 1) // size
+        if not self._states:
+            self._states.append((hashlib.md5(), hashlib.sha256()))
+        resume = min(len(self._states), count) - 1 if count else 0
+        del self._states[resume + 1:]
+        md5, sha256 = (state.copy() for state in self._states[resume])
+
+        pos = resume * size
+        for block in iter_blocks(span, size, pos):
+            index = pos // size
+            if index > resume:
+                self._states.append((md5.copy(), sha256.copy()))
+            md5.update(block)
+            sha256.update(block)
+            pos += len(block)
+            if progress:
+                progress(pos, len(span))
+        return md5.hexdigest(), sha256.hexdigest()
+
+
+def digest_span(span, progress=None, block_size=HASH_BLOCK):
+    """ return (crc32, md5, sha256) of span in one pass, for selections """
+    crc = 0
+    md5 = hashlib.md5()
+    sha256 = hashlib.sha256()
+    pos = 0
+    for block in iter_blocks(span, block_size):
+        crc = zlib.crc32(block, crc)
+        md5.update(block)
+        sha256.update(block)
+        pos += len(block)
+        if progress:
+            progress(pos, len(span))
+    return crc, md5.hexdigest(), sha256.hexdigest()
@@ -0,0 +1,456 @@
+# -*- coding: utf-8 -*-
+import os
+import re
+import mmap
+import shutil
+import tempfile
+import binascii
+from collections import OrderedDict
+from search_types import SEARCH_TYPES
+from piece_table import PieceTable, Span
+from interval_set import IntervalSet
+from stream_search import find_spans
+from hit_index import HitIndex
+from signature_search import SignatureMatcher
+from hex_text import parse_hex_text
+from undo_journal import UndoJournal
+import instrument
+
+
+class HexDocument(object):
+    """ the bytes of one file with edit, undo, search and save, no wx needed
+
+        doc = HexDocument.FromFile("image.bin")
+        for start, end in doc.FindIter("DEADBEEF"):
+            doc.Patch(start, b"\\x00\\x00\\x00\\x00")
+        doc.SaveToPath("image.bin")
+        doc.Close()
+
+    Views follow the edits with AddListener(func), func(start, removed, inserted)
+    is called after removed bytes at start were replaced by inserted bytes.
+    """
+    class Actions:
+        EditCell = "EditCell"
+        RemoveCells = "RemoveCells"
+        InsertCells = "InsertCells"
+
+    HIT_CACHE_SIZE = 8
+    UNDO_BUDGET = UndoJournal.BUDGET
+
+    def __init__(self, binary=b"", length=None):
+        self.buffer = PieceTable(binary, length)
+
+        self.path = None
+        self._file = None
+        self._map = None
+        self._backing_path = None  # temp file backing the document after a failed replace
+        self._dirty_extents = IntervalSet()  # bytes changed since the file was mapped
+        self._layout_changed = False  # bytes were inserted or deleted
+        self._hit_cache = OrderedDict()  # (text, find_type) => HitIndex
+        self._changed_cells = IntervalSet()  # edited bytes
+        self._journal = UndoJournal(self.UNDO_BUDGET)
+        self._listeners = []
+
+    @classmethod
+    def FromFile(cls, path, length=None):
+        """ map the file read-only, bytes are paged in when they are read
+        and edits go to the piece table overlay
+        """
+        doc = cls(b"", 0)
+        doc._map_file(path, length)
+        return doc
+
+    def _map_file(self, path, length=None):
+        bin_file = open(path, "rb")
+        size = os.fstat(bin_file.fileno()).st_size
+        if size:
+            binary = mmap.mmap(bin_file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            binary = b""  # mmap can not map an empty file
+
+        # the old mapping is left to the garbage collector, undo records may still use it
+        if self._file is not None:
+            self._file.close()
+        self._remove_backing()
+        self.buffer = PieceTable(binary, length)
+        self.path = os.path.abspath(path)
+        self._file = bin_file
+        self._map = binary if size else None
+        self._dirty_extents.clear()
+        self._layout_changed = False
+
+    def Close(self):
+        """ release the mapped file and the undo journal """
+        self._journal.Clear()
+        self._release_map()
+        self._remove_backing()
+
+    def _release_map(self):
+        """ close the buffer, the map and the file, the caller sets a new buffer """
+        self.buffer.close()
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                pass  # a search still holds a view, the map is closed when it is collected
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _remove_backing(self):
+        if self._backing_path is not None:
+            try:
+                os.remove(self._backing_path)
+            except OSError:
+                pass
+            self._backing_path = None
+
+    @property
+    def RamSize(self):
+        """ bytes only kept in memory: the add blocks, the undo records and the hit indexes """
+        hits = sum(len(index) for index in self._hit_cache.values()) * 16
+        return self.buffer.RamSize + self._journal.RamSize + hits
+
+    @property
+    def MappedSize(self):
+        return len(self._map) if self._map is not None else 0
+
+    def Trim(self):
+        """ give back the memory the document can do without: the undo payloads go
+        to the spill file and the clean pages of the map are dropped, they are read
+        from the file again when they are needed
+        """
+        self._journal.Spill()
+        if self._map is not None and hasattr(mmap, "MADV_DONTNEED"):
+            try:
+                self._map.madvise(mmap.MADV_DONTNEED)
+            except (ValueError, OSError):
+                pass  # closed by a save or not supported, the os still pages it out
+
+    def AddListener(self, func):
+        self._listeners.append(func)
+
+    def RemoveListener(self, func):
+        self._listeners.remove(func)
+
+    @property
+    def length(self):
+        return self.buffer.length
+
+    @property
+    def String(self):
+        return self.buffer.read()
+
+    @property
+    def ChangedCells(self):
+        return self._changed_cells
+
+    def IsChanged(self, addr):
+        return addr in self._changed_cells
+
+    def SetChanged(self, addr, changed=True):
+        if changed:
+            self._changed_cells.add(addr, addr + 1)
+        else:
+            self._changed_cells.remove(addr, addr + 1)
+
+    def ClearChanged(self):
+        self._changed_cells.clear()
+
+    def _get_value_by_addr(self, addr, length=1):
+        return self.buffer.read(addr, length)
+
+    def _set_value_by_addr(self, addr, value):
+        if addr > self.length:
+            return False
+        if addr == self.length:  # append
+            self.InsertRange(self.length, value)
+        else:  # overwrite
+            self.buffer.replace(addr, value)
+            self._dirty_extents.add(addr, addr + len(value))
+            self._on_edit(addr, len(value), len(value))
+        return True
+
+    def Patch(self, addr, value):
+        """ overwrite bytes at addr and mark them changed, bytes past the end are
+        appended, return False when addr is past the end
+        """
+        if addr > self.length:
+            return False
+        head = value[:self.length - addr]
+        if head:
+            saved_value = self._get_value_by_addr(addr, len(head))
+            if saved_value != head:
+                changed = bytes(addr + i in self._changed_cells for i in range(len(head)))
+                self._set_value_by_addr(addr, head)
+                self._changed_cells.add(addr, addr + len(head))
+                self._record_action(self.Actions.EditCell, (addr, saved_value, changed))
+        tail = value[len(head):]
+        if tail:
+            # an append is undone as an insertion
+            start = self.length
+            self.InsertRange(start, tail)
+            self._changed_cells.add(start, start + len(tail))
+        return True
+
+    @instrument.timed("SaveFile", size=lambda result, self, output: self.length)
+    def SaveFile(self, output):
+        """ output must be a file like object supports 'write' """
+        self.buffer.write_to(output)
+
+    def SaveToPath(self, path, in_place=True):
+        """ in_place=False saves to a new file even when only bytes were patched, the
+        snapshots still read by another thread keep the old bytes
+        """
+        if self.path is not None and os.path.isfile(path) and os.path.samefile(path, self.path):
+            # truncating the mapped file would pull the bytes from under the buffer
+            if (not in_place or self._layout_changed or self._map is None or
+                    self.length != os.path.getsize(path)):
+                self._save_replace(path)
+            else:
+                self._save_in_place(path)
+        else:
+            with open(path, "wb") as output:
+                self.SaveFile(output)
+
+    def _save_in_place(self, path):
+        """ only write the changed extents back, the layout of the file is unchanged """
+        fd = os.open(path, os.O_WRONLY | getattr(os, "O_BINARY", 0))
+        try:
+            for start, end in self._dirty_extents:
+                data = self.buffer.read(start, end - start)
+                if hasattr(os, "pwrite"):
+                    os.pwrite(fd, data, start)
+                else:
+                    os.lseek(fd, start, os.SEEK_SET)
+                    os.write(fd, data)
+        finally:
+            os.close(fd)
+        # the mapping now holds the saved bytes, drop the overlay
+        self.buffer = PieceTable(self._map or b"", self.length)
+        self._dirty_extents.clear()
+
+    def _save_replace(self, path):
+        """ stream to a temp file next to path, rename it over path and map the result
+
+        The undo records that read the old mapping keep it alive. Windows does not
+        replace a file that is open or mapped: only when the rename fails are those
+        records moved to the spill file and the map released before a second try.
+        When that fails too the temp file holds the document until the next save.
+        """
+        fd, temp_path = tempfile.mkstemp(prefix=".%s." % os.path.basename(path),
+                                         dir=os.path.dirname(os.path.abspath(path)))
+        try:
+            with os.fdopen(fd, "wb") as output:
+                self.SaveFile(output)
+            shutil.copymode(path, temp_path)
+        except:
+            os.remove(temp_path)
+            raise
+        try:
+            os.replace(temp_path, path)
+        except OSError:
+            self._journal.Detach()
+            self._release_map()
+            self.buffer = PieceTable(b"", 0)
+            try:
+                os.replace(temp_path, path)
+            except OSError:
+                self._map_file(temp_path)
+                self._backing_path = temp_path
+                self.path = os.path.abspath(path)
+                self._layout_changed = True  # path still has the old bytes
+                raise
+        self._map_file(path)
+
+    def GetBinary(self, start=0, length=None):
+        if length is None:
+            length = self.length
+        return self.buffer.read(start, length)
+
+    def GetText(self, start=0, length=None):
+        return binascii.b2a_hex(self.GetBinary(start, length)).decode("ascii").upper()
+
+    def InsertText(self, start, text):
+        """ text is hex digits, whitespace and dump address columns are skipped """
+        value = parse_hex_text(text)
+        if value:
+            self.InsertRange(start, value)
+
+    @instrument.timed("_delete_range", size=lambda result, self, start, length: len(result))
+    def _delete_range(self, start, length):
+        if start >= self.length:
+            return Span()
+        deleted_data = self.buffer.delete(start, length)
+        self._layout_changed = True
+        self._on_edit(start, len(deleted_data), 0)
+        return deleted_data
+
+    def DeleteRange(self, start, length):
+        deleted_data = self._delete_range(start, length)
+
+        if len(deleted_data):
+            self._record_action(self.Actions.RemoveCells, (start, deleted_data))
+
+    @instrument.timed("_insert_range", size=lambda result, self, start, value: len(value))
+    def _insert_range(self, start, value):
+        """ value is bytes or a Span cut from the buffer """
+        if isinstance(value, Span):
+            start = self.buffer.insert_span(start, value)
+        else:
+            start = self.buffer.insert(start, value)
+        self._layout_changed = True
+        self._on_edit(start, 0, len(value))
+        return start
+
+    def InsertRange(self, start, value):
+        start = self._insert_range(start, value)
+
+        self._record_action(self.Actions.InsertCells, (start, len(value)))
+
+    def _record_action(self, action, data):
+        """ record an edit for undo, a run of edited cells is kept as one record """
+        merge = self._merge_edit_cells if action == self.Actions.EditCell else None
+        self._journal.Record(action, data, merge)
+
+    def _merge_edit_cells(self, action, data, top_action, top_data):
+        if action != top_action:
+            return None
+        addr, value, changed = data
+        top_addr, top_value, top_changed = top_data
+        top_end = top_addr + len(top_value)
+        if top_addr <= addr <= top_end:
+            # the first values of the cells in the record are already there, only
+            # the cells past its end are added
+            skip = top_end - addr
+            if skip >= len(value):
+                return top_data
+            return top_addr, top_value + value[skip:], top_changed + changed[skip:]
+
+    def _is_structural(self, action):
+        return action != self.Actions.EditCell
+
+    def Undo(self):
+        """ return True when bytes were inserted or deleted, False for cell edits """
+        try:
+            action, data = self._journal.PopUndo()
+        except IndexError:
+            return
+        done_action, done_data = self.Do(action, data)
+        if done_action is False:
+            self._journal.PushUndo(action, data)
+            return self._is_structural(action)
+        elif done_action is not None:
+            self._journal.PushRedo(done_action, done_data)
+            return self._is_structural(done_action)
+
+    def Redo(self):
+        try:
+            action, data = self._journal.PopRedo()
+        except IndexError:
+            return
+        done_action, done_data = self.Do(action, data)
+        if done_action is False:
+            self._journal.PushRedo(action, data)
+            return self._is_structural(action)
+        elif done_action is not None:
+            self._journal.PushUndo(done_action, done_data)
+            return self._is_structural(done_action)
+
+    def Do(self, action, data):
+        if action == self.Actions.EditCell:
+            addr, value, changed = data
+            saved_value = self._get_value_by_addr(addr, len(value))
+            saved_changed = bytes(addr + i in self._changed_cells for i in range(len(value)))
+            if self._set_value_by_addr(addr, value):
+                for i, flag in enumerate(changed):
+                    self.SetChanged(addr + i, flag)
+                return  self.Actions.EditCell, (addr, saved_value, saved_changed)
+            return False, False
+
+        elif action == self.Actions.RemoveCells:
+            start, deleted_data = data
+            try:
+                start = self._insert_range(start, deleted_data)
+                return self.Actions.InsertCells, (start, len(deleted_data))
+            except:
+                return False, False
+
+        elif action == self.Actions.InsertCells:
+            start, length = data
+            try:
+                deleted_data = self._delete_range(start, length)
+                return self.Actions.RemoveCells, (start, deleted_data)
+            except:
+                return False, False
+
+        return None, None
+
+    @property
+    def CanUndo(self):
+        return self._journal.CanUndo
+
+    @property
+    def CanRedo(self):
+        return self._journal.CanRedo
+
+    def _search_regex(self, text, find_type):
+        """ return the regex of a search and the length of its hits, None for regex searches """
+        if find_type == SEARCH_TYPES.Hexadecimal:
+            text = binascii.a2b_hex(text)
+            return re.escape(text), len(text)
+
+        elif find_type == SEARCH_TYPES.NormalText:
+            return re.escape(text).encode(), len(text.encode())
+
+        elif find_type == SEARCH_TYPES.RegexText:
+            return text.encode(), None
+
+        elif find_type == SEARCH_TYPES.SignatureList:
+            # one automaton finds every pattern of the list in a single pass
+            matcher = SignatureMatcher.FromHexText(text)
+            return matcher, matcher.max_length
+
+        raise Exception("unsupported search type")
+
+    def FindIter(self, text, find_type=SEARCH_TYPES.Hexadecimal, progress=None):
+        """ return a iter of (start, end) """
+        regex, max_length = self._search_regex(text, find_type)
+        return self.FindRegex(regex, progress=progress)
+
+    @instrument.timed_iter("FindRegex")
+    def FindRegex(self, regex, start=0, end=None, progress=None):
+        """ scan the buffer window by window, the file is never copied as a whole """
+        return find_spans(self.buffer, regex, start, end, progress=progress)
+
+    def GetHitIndex(self, text, find_type=SEARCH_TYPES.Hexadecimal):
+        """ return the cached HitIndex of a search, an empty one is cached when there is none,
+        it is complete once a FindRegex over its regex has been added to it
+        """
+        key = (text, find_type)
+        index = self._hit_cache.pop(key, None)
+        if index is None:
+            index = HitIndex(*self._search_regex(text, find_type))
+        self._hit_cache[key] = index
+        while len(self._hit_cache) > self.HIT_CACHE_SIZE:
+            self._hit_cache.popitem(last=False)[1].Clear()  # no longer follows the edits
+        return index
+
+    def _on_edit(self, start, removed, inserted):
+        """ removed bytes at start were replaced by inserted bytes """
+        self._changed_cells.shift(start, removed, inserted)
+        self._update_hit_indexes(start, removed, inserted)
+        for func in self._listeners:
+            func(start, removed, inserted)
+
+    def _update_hit_indexes(self, start, removed, inserted):
+        for key, index in list(self._hit_cache.items()):
+            if not index.complete:
+                index.Clear()
+                del self._hit_cache[key]
+            elif not index.Update(self.buffer, start, removed, inserted):
+                del self._hit_cache[key]
+
+    def GetBuffer(self):
+        return self.buffer
@@ -1,22 +1,37 @@
 # -*- coding: utf-8 -*-
 import os
 import wx
+import threading
 import struct
-import re
 import wx.lib.agw.buttonpanel as btnpanel
 import wx.grid as wxgrid
-import wx.lib.agw.genericmessagedialog as gmd
 from transparent_text import TransparentText
 from number_validator import NumberValidator
 from valid_types import VALID_TYPES
 from search_types import SEARCH_TYPES
+from hex_text import search_text
 from hex_grid_table import HexGridTable
+from hex_document import HexDocument
+from search_worker import SearchWorker
+from transmission import Transmission, open_sink
+from signature_search import SignatureMatcher
+from minimap import Minimap
 from bin_file_drop_target import BinFileDropTarget
+from memory_pool import POOL
+import instrument
+
+
+# raw bytes on the clipboard, shared between editor instances
+BINARY_DATA_FORMAT = "application/x-hexeditor-binary"
 
 
 class HexEditor(wx.Panel):
+    CLIPBOARD_TEXT_LIMIT = 0x1000000  # larger copies only go to the clipboard as raw bytes
 
     def __init__(self, parent, *args, **kwargs):
+        # on_open_files(filenames, selection=None) opens dropped files and search results,
+        # by default the first file replaces the buffer
+        self._on_open_files = kwargs.pop("on_open_files", None)
         wx.Panel.__init__(self, parent, *args, **kwargs)
 
         self.__init_ctrls(parent)
@@ -43,11 +58,31 @@ class HexEditor(wx.Panel):
         # hexエディタ部分
         self._grid_selecting_start = False
         self._in_selecting = False
+        self._selection = None  # (start, length), drawn by the table attrs
+        self._selection_anchor = None  # address a Shift+click or Shift+arrow selection started at
+        self._moving_cursor = False
+        self.compare_grid = None  # a compared file is shown at the right of the grid
+        self._compare_worker = None
+        self._checksum_frame = None
+        self._inspector_frame = None
+        self._file_search_frame = None
         self.grid = wxgrid.Grid(self, -1)
         self._hex_cols = 16
         self._init_grid()
         self._reset_grid()
-        sizer.Add(self.grid, 1, wx.EXPAND)
+
+        self._grid_sizer = wx.BoxSizer(wx.HORIZONTAL)
+        self._grid_sizer.Add(self.grid, 1, wx.EXPAND)
+        # the grid of a file with more rows than HexGridTable.WINDOW_ROWS only sees a window
+        # of them, this scroll bar covers the whole file and the one of the grid is hidden
+        self._row_scrollbar = wx.ScrollBar(self, -1, style=wx.SB_VERTICAL)
+        self._row_scrollbar.Bind(wx.EVT_SCROLL, self.OnRowScroll)
+        self._row_scrollbar.Hide()
+        self._row_scroll_shift = 0  # rows per scroll bar unit = 1 << shift
+        self._grid_sizer.Add(self._row_scrollbar, 0, wx.EXPAND)
+        self.minimap = Minimap(self, self.OnMinimapJump)
+        self._grid_sizer.Add(self.minimap, 0, wx.EXPAND)
+        sizer.Add(self._grid_sizer, 1, wx.EXPAND)
 
         # ステータスバー
         self.status_bar = self.__init_status_bar()
@@ -106,6 +141,10 @@ class HexEditor(wx.Panel):
         toolbar.Bind(wx.EVT_BUTTON, self.OnTransmissionButton, id=btn_menu2.GetId())
         toolbar.AddControl(btn_menu2)
 
+        self._transmission = None
+        self._transmission_dest = "log/data.bin"
+        self._transmission_resume = {}  # destination -> offset where the last transmission stopped
+
         toolbar.DoLayout()
         return toolbar
 
@@ -131,8 +170,15 @@ class HexEditor(wx.Panel):
             self.find_types.append(radio)
         self.find_types[0].SetValue(True)
 
+        btn_load = wx.Button(find_bar, label="Patterns...", size=(70, 22))
+        find_bar.Bind(wx.EVT_BUTTON, lambda e: self.LoadPatternsDialog(), id=btn_load.GetId())
+        find_bar.AddControl(btn_load)
+
         self._search_options = {}
-        self._search_result = None
+        self._search_hits = None  # HitIndex of the current search
+        self._search_worker = None
+        self._search_pos = None  # start of the last shown hit
+        self._search_pending = 0  # direction of a F3 pressed while the worker had no hit for it
 
         find_bar.DoLayout()
         return find_bar
@@ -155,11 +201,16 @@ class HexEditor(wx.Panel):
 
         self.grid.Bind(wx.EVT_KEY_DOWN, self.OnGridKeyDown)
         self.grid.Bind(wx.grid.EVT_GRID_SELECT_CELL, self.OnSelectCell)
+        self.grid.Bind(wx.grid.EVT_GRID_RANGE_SELECT, self.OnRangeSelect)
+        self.grid.Bind(wx.grid.EVT_GRID_CELL_CHANGING, self.OnCellChanging)
         self.grid.Bind(wx.grid.EVT_GRID_CELL_RIGHT_CLICK, self.OnCellRightClicked)
         self.grid.Bind(wx.grid.EVT_GRID_LABEL_RIGHT_CLICK, self.OnCellRightClicked)
 
         self.grid.GetGridColLabelWindow().Bind(wx.EVT_LEFT_DOWN, self.OnGridColLeftDown)
         self.grid.GetGridWindow().Bind(wx.EVT_LEFT_DOWN, self.OnGridLeftDown)
+        self.grid.Bind(wx.EVT_SCROLLWIN, self.OnGridScroll)
+        if instrument.ENABLED:
+            self.grid.GetGridWindow().Bind(wx.EVT_PAINT, self.OnGridPaint)
         self.grid.GetGridWindow().Bind(wx.EVT_LEFT_UP, self.OnGridLeftUp)
         self.grid.GetGridWindow().Bind(wx.EVT_MOTION, self.OnGridLeftMotion)
         self.grid.GetGridRowLabelWindow().Bind(wx.EVT_MOTION, self.OnGridLeftMotion)
@@ -171,14 +222,18 @@ class HexEditor(wx.Panel):
 
     def AutoSize(self, event=None):
         size = self.GetSize()
+        if self.minimap.IsShown():
+            size = (size[0] - self.minimap.WIDTH, size[1])
+        grids = [self.grid] if self.compare_grid is None else [self.grid, self.compare_grid]
         sb_width = wx.SystemSettings.GetMetric(wx.SYS_VSCROLL_X)
-        col_size = (size[0] - 150 - sb_width - self.grid.GetRowLabelSize()) / self.HexCols
-        if col_size < -1:
-            col_size = -1
-        for col in range(self.grid.GetNumberCols() - 1):
-            self.grid.SetColSize(col, col_size)
-        self.grid.SetColSize(self.grid.GetNumberCols() - 1, 140)
-        self.grid.Refresh()
+        for grid in grids:
+            col_size = (size[0] // len(grids) - 150 - sb_width - grid.GetRowLabelSize()) // self.HexCols
+            if col_size < -1:
+                col_size = -1
+            for col in range(grid.GetNumberCols() - 1):
+                grid.SetColSize(col, col_size)
+            grid.SetColSize(grid.GetNumberCols() - 1, 140)
+            grid.Refresh()
         event and event.Skip()
 
     def _init_grid_menu(self, main_menu=False):
@@ -188,6 +243,13 @@ class HexEditor(wx.Panel):
                 ("New", lambda e: self.NewDialog()),
                 ("Load", lambda e: self.OpenFileDialog()),
                 ("Save", lambda e: self.SaveFileDialog()),
+                "-",
+                ("Compare...", lambda e: self.CompareDialog()),
+                ("Close Compare", lambda e: self.CloseCompare()),
+                ("Checksums...", lambda e: self.ChecksumDialog()),
+                ("Array Inspector...", lambda e: self.InspectorDialog()),
+                ("Search in Files...", lambda e: self.FileSearchDialog()),
+                ("Minimap", lambda e: self.ToggleMinimap()),
             ]
         else:
             items = [
@@ -201,6 +263,13 @@ class HexEditor(wx.Panel):
                 "-",
                 ("Delete", lambda e: self._delete()),
                 ("Select All", lambda e: self.SetSelection(0, self.Length, False)),
+                "-",
+                ("Find Next", lambda e: self.Find(1)),
+                ("Find Previous", lambda e: self.Find(-1)),
+                ("Jump to Hit", lambda e: self.JumpToHitDialog()),
+                "-",
+                ("Next Difference", lambda e: self.GotoDifference(1)),
+                ("Previous Difference", lambda e: self.GotoDifference(-1)),
             ]
         for item in items:
             if item == "-":
@@ -215,10 +284,25 @@ class HexEditor(wx.Panel):
 
     def __init_status_bar(self):
         sb = wx.StatusBar(self)
-        sb.SetFieldsCount(4)
-        sb.SetStatusWidths([-2, -1, -1, -1])
+        if instrument.ENABLED:
+            # the counters of the hot paths in a last field, refreshed twice a second
+            sb.SetFieldsCount(7)
+            sb.SetStatusWidths([-2, -1, -1, -1, -2, -2, -3])
+            self._profile_timer = wx.Timer(self)
+            self.Bind(wx.EVT_TIMER, self.OnProfileTimer, self._profile_timer)
+            self._profile_timer.Start(500)
+        else:
+            sb.SetFieldsCount(6)
+            sb.SetStatusWidths([-2, -1, -1, -1, -2, -2])
         return sb
 
+    def OnGridPaint(self, event):
+        instrument.COUNTERS.Repaint()
+        event.Skip()
+
+    def OnProfileTimer(self, event):
+        self.status_bar.SetStatusText(instrument.COUNTERS.StatusText(), 6)
+
     def _clear_value_text(self):
         self._current_text.SetLabel("")
         self._value_hex.SetLabel("")
@@ -236,7 +320,7 @@ class HexEditor(wx.Panel):
         else:
             self._value_chr.SetLabel(" ")
 
-    def _update_status(self, length=None, row=None, col=None, sel=None):
+    def _update_status(self, length=None, row=None, col=None, sel=None, search=None, transfer=None):
         if length is not None:
             self.status_bar.SetStatusText("Length: 0x%X(%d)" % (length, length), 0)
         if row is not None:
@@ -245,6 +329,10 @@ class HexEditor(wx.Panel):
             self.status_bar.SetStatusText("Col: %s" % col, 2)
         if sel is not None:
             self.status_bar.SetStatusText("Selected: %s" % sel, 3)
+        if search is not None:
+            self.status_bar.SetStatusText(search, 4)
+        if transfer is not None:
+            self.status_bar.SetStatusText(transfer, 5)
 
     @property
     def HexCols(self):
@@ -262,23 +350,47 @@ class HexEditor(wx.Panel):
     def Length(self):
         return self.grid.GetTable().length
 
+    @property
+    def Path(self):
+        """ absolute path of the file shown, None for a buffer made in memory """
+        return self.grid.GetTable().path
+
+    @instrument.timed("HexEditor._set_grid_table")
     def _set_grid_table(self, table):
         self.grid.BeginBatch()
         self._reset_grid()
+        self._reset_search()
         self.grid.SetTable(table, True)
         self.AutoSize()
         self.grid.EndBatch()
 
         self._update_status(length=table.length)
         self.toolbar.DoLayout()
+        if self._checksum_frame:
+            self._checksum_frame.ScheduleRecompute()
+        if self._inspector_frame:
+            self._inspector_frame.ScheduleInspect()
+        self.minimap.SetDocument(table.document)
+        wx.CallAfter(self._update_minimap_view)
+        self._update_row_scrollbar()
+        self.ActivateDocument()
+
+    def _refresh_grid(self):
+        """ after an edit, the table already sent the rows it added or removed,
+        only the visible cells are repainted
+        """
+        self._reset_grid_selecting()
+        self._set_selection_range(None)
+        self._update_status(length=self.Length)
 
     def GetCurrentAddr(self):
         row, col = self.grid.GridCursorRow, self.grid.GridCursorCol
-        addr = row * self.HexCols + col
+        addr = (row + self._base_row()) * self.HexCols + col
         return addr
 
     def SetCurrentAddr(self, addr):
         if addr < self.Length:
+            self._show_row(addr // self.HexCols)
             row, col = self.AddrToRowCol(addr)
             self.grid.SetGridCursor(row, col)
             self.SetSelection(addr, 1, False)
@@ -298,15 +410,21 @@ class HexEditor(wx.Panel):
 
     @property
     def Selection(self):
-        cells = self.grid.GetSelectedCells()
-        top_left = self.grid.GetSelectionBlockTopLeft()
-        bottom_right = self.grid.GetSelectionBlockBottomRight()
+        """ (start, length) or None """
+        return self._selection
 
-        addrs = [self.RowColToAddr(row, col) for (row, col) in top_left + bottom_right + cells]
-        if addrs:
-            min_addr = min(addrs)
-            max_addr = max(addrs)
-            return min_addr, max_addr - min_addr + 1
+    def _set_selection_range(self, selection):
+        self._selection = selection
+        self._selection_anchor = None
+        table = self.grid.GetTable()
+        if isinstance(table, HexGridTable):
+            table.SetSelectionRange(*(selection or ()))
+        self.grid.ClearSelection()  # wx keeps no per-cell selection
+        self.grid.ForceRefresh()
+        if self._checksum_frame and self._checksum_frame.SelectionOnly:
+            self._checksum_frame.ScheduleRecompute()
+        if self._inspector_frame:
+            self._inspector_frame.ScheduleInspect()
 
     def SetBinary(self, binary, length=None):
         """
@@ -316,15 +434,30 @@ class HexEditor(wx.Panel):
             raise Exception("binary must be string")
 
         table = HexGridTable(binary, length)
+        self._close_table()
         self._set_grid_table(table)
 
-    def SetBinaryFile(self, path, length=-1):
-        """ filename
+    def SetBinaryFile(self, path, length=None):
+        """ filename, the file is memory mapped and read on demand
         """
-        bin_file = open(path, "rb")
-        binary = bin_file.read(length)
-        bin_file.close()
-        self.SetBinary(binary, length=length)
+        table = HexGridTable.FromFile(path, length)
+        self._close_table()
+        self._set_grid_table(table)
+
+    def _close_table(self):
+        if self._transmission is not None:
+            # not joined, a sink may block for long: the snapshot being sent keeps
+            # the mapping alive until the worker stops
+            self._transmission.Cancel()
+        self.CloseCompare()
+        if self._checksum_frame:
+            self._checksum_frame.Stop()  # its worker reads the buffer of the table
+        if self._inspector_frame:
+            self._inspector_frame.Release()  # its arrays are views of the buffer
+        self.minimap.ReleaseDocument()
+        table = self.grid.GetTable()
+        if isinstance(table, HexGridTable):
+            table.Close()
 
     def _file_dialog(self, *args, **kwargs):
         wildcard = 'Binary files (*.bin;*.txt)|*.bin;*.txt|All files (*.*)|*.*'
@@ -339,6 +472,7 @@ class HexEditor(wx.Panel):
         dlg.Destroy()
 
     def MessageBox(self, message, title="", style=wx.OK | wx.ICON_INFORMATION):
+        import wx.lib.agw.genericmessagedialog as gmd  # loaded with the first message, not at startup
         dlg = gmd.GenericMessageDialog(self, message, title, style)
         res = dlg.ShowModal()
         dlg.Destroy()
@@ -372,15 +506,99 @@ class HexEditor(wx.Panel):
 
     def LoadFile(self, filename):
         if os.path.isfile(filename):
-            self.SetBinaryFile(filename, os.path.getsize(filename))
+            self.SetBinaryFile(filename)
         else:
             self.MessageBox("Can not open file %s" % filename, "Load File Error", wx.OK | wx.ICON_ERROR)
         self.grid.SetFocus()
 
+    def OpenFiles(self, filenames):
+        if self._on_open_files is not None:
+            self._on_open_files(filenames)
+        elif filenames:
+            self.LoadFile(filenames[0])
+
+    def OpenFileAt(self, path, start, length=1):
+        """ open the file and select length bytes at start """
+        if self._on_open_files is not None:
+            self._on_open_files([path], selection=(start, length))
+        elif os.path.abspath(path) == self.Path:
+            self.SetSelection(start, length, True)
+        else:
+            self.LoadFile(path)
+            if self.Path is not None:
+                self.SetSelection(start, length, True)
+
+    def ActivateDocument(self):
+        """ the tables on screen become the most recently used of the memory pool,
+        the pool trims the others first
+        """
+        tables = [self.grid.GetTable()]
+        if self.compare_grid is not None:
+            tables.append(self.compare_grid.GetTable())
+        POOL.Touch(*[table for table in tables if isinstance(table, HexGridTable)])
+
+    def DeactivateDocument(self):
+        """ the page is switched away, its background work waits until it is shown again """
+        self.minimap.Pause()
+
+    def CloseDocument(self):
+        """ stop the workers and release the file before the editor is destroyed """
+        self._reset_search()
+        self._close_table()
+
+    def LoadFileAsync(self, filename, on_loaded=None):
+        """ open the file on a worker thread so the window is painted and responsive
+        while a slow disk answers, on_loaded() is called once the grid shows the file
+        """
+        self.status_bar.SetStatusText("Loading %s..." % os.path.basename(filename), 0)
+
+        def load():
+            try:
+                document = HexDocument.FromFile(filename)
+            except Exception as e:
+                wx.CallAfter(self._on_file_loaded, filename, None, e, on_loaded)
+            else:
+                wx.CallAfter(self._on_file_loaded, filename, document, None, on_loaded)
+
+        thread = threading.Thread(target=load)
+        thread.daemon = True
+        thread.start()
+
+    def _on_file_loaded(self, filename, document, error, on_loaded):
+        if not self:  # the window was closed while loading
+            if document is not None:
+                document.Close()
+            return
+        if error is not None:
+            self._update_status(length=self.Length)
+            self.MessageBox("Can not open file %s\n%s" % (filename, error), "Load File Error", wx.OK | wx.ICON_ERROR)
+            return
+        self._close_table()
+        self._set_grid_table(HexGridTable(document=document))
+        self.grid.SetFocus()
+        if on_loaded:
+            on_loaded()
+
     def SaveFile(self, filename):
-        f = open(filename, "wb")
-        self.grid.GetTable().SaveFile(f)
-        f.close()
+        # the workers read the mapped file, a save may have to close it
+        self._stop_search()
+        self.minimap.Stop()
+        if self._checksum_frame:
+            self._checksum_frame.Stop()
+        if self._inspector_frame:
+            self._inspector_frame.Release()
+        # a transmission goes on sending its snapshot, the save must not write into it
+        sending = self._transmission is not None and not self._transmission.done
+        try:
+            self.grid.GetTable().SaveToPath(filename, in_place=not sending)
+        except (IOError, OSError) as e:
+            self.MessageBox("Can not save file %s\n%s" % (filename, e), "Save File Error", wx.OK | wx.ICON_ERROR)
+        self.minimap.Recompute()
+        if self._checksum_frame:
+            self._checksum_frame.ScheduleRecompute()
+        if self._inspector_frame:
+            self._inspector_frame.ScheduleInspect()
+        self.grid.ForceRefresh()
 
     def GetCellString(self, row, col, length=1):
         val = ""
@@ -392,41 +610,32 @@ class HexEditor(wx.Panel):
         """ val must be Hex string
         """
         val = int(val, 16)
+        self._stop_search()
         # update the table
         addr = self.RowColToAddr(row, col)
 
         self.grid.SetCellValue(row, col, "%02X" % val)
 
     def AddrToRowCol(self, addr):
-        return addr / self.HexCols, addr % self.HexCols
+        """ the row is a row of the grid, addr must be in the window of the table """
+        row, col = divmod(addr, self.HexCols)
+        return row - self._base_row(), col
 
     def RowColToAddr(self, row, col, check_max=True):
         col = self.HexCols - 1 if col >= self.HexCols else col
-        addr = row * self.HexCols + col
+        addr = (row + self._base_row()) * self.HexCols + col
         if check_max:
             addr = self._check_addr_in_range(addr)
         return addr
 
     def SetSelection(self, addr, length=1, jumpto=False):
+        self._show_row(addr // self.HexCols)
         row, col = self.AddrToRowCol(addr)
-        end_row, end_col = self.AddrToRowCol(addr + length - 1)
 
-        self.grid.Freeze()
-        self.grid.BeginBatch()
+        self._moving_cursor = True
         self.grid.SetGridCursor(row, col)
-        if length > 0:
-            # in same row
-            if row == end_row:
-                self.grid.SelectBlock(row, col, end_row, end_col)
-            elif end_row > row:
-                #first row
-                self.grid.SelectBlock(row, col, row, self.HexCols - 1)
-                if end_row - row > 1:
-                    self.grid.SelectBlock(row + 1, 0, end_row - 1, self.HexCols - 1, addToSelected=True)
-                #last row
-                self.grid.SelectBlock(end_row, 0, end_row, end_col, addToSelected=True)
-        self.grid.EndBatch()
-        self.grid.Thaw()
+        self._moving_cursor = False
+        self._set_selection_range((addr, length) if length > 0 else None)
         self._update_status(sel=length)
         if jumpto:
             self.JumpTo(row, col)
@@ -439,24 +648,80 @@ class HexEditor(wx.Panel):
         event.Skip()
 
     def OnTransmissionButton(self, event):
-      print("OnTransmissionButton")
-      
-      dlg = wx.MessageDialog(parent = None, message = u"終了します。よろしいですか？", caption = u"終了確認", style = wx.YES_NO)
-      result = dlg.ShowModal()
-      if result == wx.ID_YES:
-        table = self.grid.GetTable()
-        buf = table.GetBuffer()
-        with open("log/data.bin", "wb") as fout:        
-            for x in buf:
-                fout.write(x)
-        wx.Exit()
+        if self._transmission is not None and not self._transmission.done:
+            if self.MessageBox(u"送信中です。中止しますか？", "Transmission",
+                               wx.YES_NO | wx.ICON_QUESTION) == wx.ID_YES:
+                self._transmission.Cancel()
+            return
+
+        dlg = wx.TextEntryDialog(self, "Destination (file path, tcp://host:port, unix:///path, serial:///dev/tty...):",
+                                 "Transmission", self._transmission_dest)
+        if dlg.ShowModal() != wx.ID_OK:
+            dlg.Destroy()
+            return
+        dest = dlg.GetValue().strip()
+        dlg.Destroy()
+        if dest:
+            self.Transmit(dest)
+
+    def Transmit(self, dest, offset=None):
+        """ stream the table to dest in the background, a transmission that
+        stopped part way to the same destination can be resumed
+        """
+        try:
+            sink = open_sink(dest)
+        except Exception as e:
+            self.MessageBox(str(e), "Transmission Error", wx.OK | wx.ICON_ERROR)
+            return
+
+        # the snapshot shares the table pieces, editing goes on during the transmission
+        span = self.grid.GetTable().GetBuffer().snapshot()
+        if offset is None:
+            offset = 0
+            resume = self._transmission_resume.get(dest, 0)
+            if 0 < resume < len(span):
+                res = self.MessageBox("The last transmission to '%s' stopped at 0x%X.\n"
+                                      "Resume from there?" % (dest, resume),
+                                      "Transmission", wx.YES_NO | wx.CANCEL | wx.ICON_QUESTION)
+                if res == wx.ID_CANCEL:
+                    return
+                if res == wx.ID_YES:
+                    offset = resume
+
+        self._transmission_dest = dest
+        self._transmission = Transmission(sink, span, offset,
+                                          on_progress=self.OnTransmissionProgress,
+                                          on_done=self.OnTransmissionDone)
+        self._update_status(transfer="Sending 0x%X bytes..." % (len(span) - offset))
+        self._transmission.Start()
+
+    def OnTransmissionProgress(self, sent, total, rate, eta):
+        percent = sent * 100 // total if total else 100
+        self._update_status(transfer="Sending %d%% %.1f MB/s ETA %ds" % (percent, rate / 0x100000, eta))
+
+    def OnTransmissionDone(self, transmission):
+        dest = self._transmission_dest
+        if transmission.Complete:
+            self._transmission_resume.pop(dest, None)
+            self._update_status(transfer="Sent 0x%X bytes" % len(transmission.span))
+            return
+        self._transmission_resume[dest] = transmission.offset
+        if transmission.error is not None:
+            self._update_status(transfer="Transmission failed at 0x%X" % transmission.offset)
+            self.MessageBox("Error: %s" % str(transmission.error), "Transmission Error", wx.OK | wx.ICON_ERROR)
+        else:
+            self._update_status(transfer="Transmission cancelled at 0x%X" % transmission.offset)
 
     def OnFindButton(self, event):
         event.Skip()
+        self.Find(1)
+
+    def Find(self, direction=1):
+        """ jump to the next (direction > 0) or previous hit of the search in the find bar """
         text = self._find_text.GetValue()
 
         if not text:
-            self._search_result = None
+            self._reset_search()
             return
 
         options = {
@@ -468,36 +733,355 @@ class HexEditor(wx.Panel):
             if radio.GetValue() is True:
                 options["search_type"] = radio.GetLabel()
 
+        hits = self._search_hits
+        running = self._search_worker is not None and not self._search_worker.done
         if self._search_options.get("text") != options["text"] or\
             self._search_options.get("search_type") != options["search_type"] or\
-                self._search_result is None:
-
-                    if options["search_type"] == SEARCH_TYPES.Hexadecimal:
-                        text = re.sub(r'\s+', '', text)
+                hits is None or (not hits.complete and not running):
 
-                    try:
-                        self._search_result = self.grid.GetTable().FindIter(text, options["search_type"])
-                        self._search_options = options
-                    except Exception as e:
-                        self.MessageBox("Error: %s" % str(e), "Search Error", wx.OK | wx.ICON_ERROR)
+                    if not self._start_search(search_text(text, options["search_type"]), options):
                         return
 
+        self._show_hit(direction)
+
+    def _start_search(self, text, options):
+        self._reset_search()
+        table = self.grid.GetTable()
         try:
-            match = self._search_result.__next__()
-            start, end = match.span(0)
-            self.SetSelection(start, end - start, True)
-            self.grid.SetFocus()
-        except StopIteration as e:
-            self._search_result = None  # restart
-            self.MessageBox("Search to End", "Search Done")
+            hits = table.GetHitIndex(text, options["search_type"])
         except Exception as e:
             self.MessageBox("Error: %s" % str(e), "Search Error", wx.OK | wx.ICON_ERROR)
+            return False
+
+        self._search_hits = hits
+        self._search_options = options
+        if hits.complete:
+            self._update_status(search="%d hits" % len(hits))
+        else:
+            hits.Clear()
+            worker = SearchWorker(hits,
+                                  on_hits=self.OnSearchHits,
+                                  on_progress=self.OnSearchProgress,
+                                  on_done=self.OnSearchDone)
+            self._search_worker = worker
+            self._update_status(search="Searching...")
+            worker.Start(table.FindRegex(hits.regex, progress=worker.Progress))
+        return True
+
+    def _show_hit(self, direction):
+        hits = self._search_hits
+        if hits is None:
+            return
+        self._search_pending = 0
+        pos = self._search_pos
+        if direction > 0:
+            index = hits.Next(-1 if pos is None else pos)
+        else:
+            index = hits.Prev(self.Length + 1 if pos is None else pos)
+
+        if index is not None:
+            self.GotoHit(index)
+        elif self._search_worker is not None and not self._search_worker.done:
+            self._search_pending = direction  # jump when the worker finds the hit
+        elif self._search_worker is not None and self._search_worker.error is not None:
+            error = self._search_worker.error
+            self._reset_search()
+            self.MessageBox("Error: %s" % str(error), "Search Error", wx.OK | wx.ICON_ERROR)
+        else:
+            self._search_pos = None  # wrap around
+            self.MessageBox("Search to End" if direction > 0 else "Search to Start", "Search Done")
+
+    def GotoHit(self, index):
+        """ select the hit number index (from 0) of the current search """
+        hits = self._search_hits
+        if hits is None or not 0 <= index < len(hits):
+            return
+        start, end = hits[index]
+        self._search_pos = start
+        self.SetSelection(start, end - start, True)
+        self.grid.SetFocus()
+        self._update_status(search="Hit %d/%d%s" % (index + 1, len(hits), "" if hits.complete else "+"))
+
+    def ChecksumDialog(self):
+        """ show the checksum window, it follows the edits until it is closed """
+        if not self._checksum_frame:  # never opened or destroyed by a close
+            from checksum_frame import ChecksumFrame  # loaded with the first use, not at startup
+            self._checksum_frame = ChecksumFrame(self)
+        self._checksum_frame.Show()
+        self._checksum_frame.Raise()
+        self._checksum_frame.Recompute()
+
+    def InspectorDialog(self):
+        """ show the selection as an array of numbers, it follows the selection until it is closed """
+        if not self._inspector_frame:
+            from array_inspector import ArrayInspector  # numpy is loaded with the first use
+            self._inspector_frame = ArrayInspector(self)
+        self._inspector_frame.Show()
+        self._inspector_frame.Raise()
+        self._inspector_frame.Inspect()
+
+    def FileSearchDialog(self):
+        """ search a directory or dropped files, the results open at their hit """
+        if not self._file_search_frame:
+            from file_search_frame import FileSearchFrame  # and multiprocessing with it
+            self._file_search_frame = FileSearchFrame(self)
+        self._file_search_frame.Show()
+        self._file_search_frame.Raise()
+
+    def CompareDialog(self):
+        filename = self._file_dialog("Compare with", style=wx.FD_OPEN)
+        if filename:
+            self.CompareWith(filename)
+
+    def CompareWith(self, path):
+        """ show the file at path beside the grid and highlight the bytes that differ """
+        from file_compare import DiffIndex, diff_ranges  # numpy is loaded with the first compare
+        try:
+            other = HexGridTable.FromFile(path, hex_cols=self.HexCols)
+        except (IOError, OSError) as e:
+            self.MessageBox("Can not open file %s\n%s" % (path, e), "Compare Error", wx.OK | wx.ICON_ERROR)
+            return
+        self.CloseCompare()
+
+        grid = wxgrid.Grid(self, -1)
+        grid.CreateGrid(0, 0)
+        grid.SetDefaultCellAlignment(wx.ALIGN_CENTRE, wx.ALIGN_CENTRE)
+        grid.SetRowLabelAlignment(wx.ALIGN_RIGHT, wx.ALIGN_CENTER)
+        grid.DisableDragColSize()
+        grid.DisableDragRowSize()
+        grid.SetTable(other, True)
+        grid.EnableEditing(False)
+        grid.Bind(wx.EVT_SCROLLWIN, self.OnGridScroll)
+        self._grid_sizer.Add(grid, 1, wx.EXPAND | wx.LEFT, 4)
+        self.compare_grid = grid
+        self.Layout()
+        self.AutoSize()
+        self.ActivateDocument()
+
+        diffs = DiffIndex()
+        worker = SearchWorker(diffs, on_progress=self.OnCompareProgress, on_done=self.OnCompareDone)
+        self._compare_worker = worker
+        self._update_status(search="Comparing...")
+        # both sides are snapshots, the worker never sees a piece list being edited
+        worker.Start(diff_ranges(self.grid.GetTable().GetBuffer().snapshot(),
+                                 other.GetBuffer().snapshot(),
+                                 progress=worker.Progress))
+
+    def CloseCompare(self):
+        if self._compare_worker is not None:
+            self._compare_worker.Cancel()
+            self._compare_worker = None
+        if self.compare_grid is None:
+            return
+        grid, self.compare_grid = self.compare_grid, None
+        self._grid_sizer.Detach(grid)
+        grid.GetTable().Close()
+        grid.Destroy()
+        table = self.grid.GetTable()
+        if isinstance(table, HexGridTable):
+            table.SetDiffRanges(())
+        self.Layout()
+        self.AutoSize()
+
+    def OnCompareProgress(self, pos, total, count):
+        percent = pos * 100 // total if total else 100
+        self._update_status(search="Comparing... %d%%" % percent)
+
+    def OnCompareDone(self):
+        worker, self._compare_worker = self._compare_worker, None
+        if worker.error is not None:
+            self._update_status(search="Compare failed")
+            self.MessageBox("Error: %s" % str(worker.error), "Compare Error", wx.OK | wx.ICON_ERROR)
+            return
+        diffs = worker.hits
+        self.grid.GetTable().SetDiffRanges(diffs)
+        self.compare_grid.GetTable().SetDiffRanges(diffs)
+        self.grid.ForceRefresh()
+        self.compare_grid.ForceRefresh()
+        self._update_status(search="%d differences, 0x%X bytes" % (len(diffs), diffs.Total))
+
+    def GotoDifference(self, direction=1):
+        """ select the next (direction > 0) or previous range that differs from the compared file """
+        diffs = self.grid.GetTable().DiffRanges
+        if not diffs:
+            self._update_status(search="No differences")
+            return
+        addr = self.CurrentAddr
+        found = diffs.next_range(addr) if direction > 0 else diffs.prev_range(addr)
+        if found is None:
+            self.MessageBox("Compare to End" if direction > 0 else "Compare to Start", "Compare")
+            return
+        start, end = found
+        self.SetSelection(start, end - start, True)
+        self.grid.SetFocus()
+        self._sync_compare_scroll(self.grid)
+
+    def OnGridScroll(self, event):
+        event.Skip()
+        wx.CallAfter(self._on_grid_scrolled, event.GetEventObject())
+
+    def _on_grid_scrolled(self, grid):
+        if not self:
+            return
+        self._show_row(self._top_row(grid), grid)  # scrolled near the edge of the window
+        if self.compare_grid is not None:
+            self._sync_compare_scroll(grid)
+        self._update_minimap_view()
+        self._update_row_scrollbar()
+
+    def _sync_compare_scroll(self, source):
+        """ keep the compared file at the rows of the grid """
+        if self.compare_grid is None:
+            return
+        target = self.compare_grid if source is self.grid else self.grid
+        row = self._top_row(source)
+        self._show_row(row, target)
+        self._scroll_to_row(target, row - self._base_row(target), source.GetViewStart()[0])
+
+    def _base_row(self, grid=None):
+        table = (grid or self.grid).GetTable()
+        return table.BaseRow if isinstance(table, HexGridTable) else 0
+
+    def _top_row(self, grid):
+        """ row of the buffer at the top of the grid """
+        top = grid.GetViewStart()[1] * grid.GetScrollPixelsPerUnit()[1]
+        return max(grid.YToRow(top), 0) + self._base_row(grid)
+
+    def _scroll_to_row(self, grid, row, x=-1):
+        """ scroll the grid so its row is at the top """
+        ppunit = grid.GetScrollPixelsPerUnit()
+        grid.Scroll(x, grid.CellToRect(max(row, 0), 0).y // ppunit[1])
+
+    def _show_row(self, row, grid=None):
+        """ move the window of a table with more rows than WINDOW_ROWS when the row of
+        the buffer is near its edges, the window is centred on the row and the grid
+        keeps showing the same bytes, its cursor stays on its byte while it is in the window
+        """
+        grid = grid or self.grid
+        table = grid.GetTable()
+        if not isinstance(table, HexGridTable) or not table.IsWindowed:
+            return
+        base = table.BaseRow
+        margin = table.WINDOW_ROWS // 4
+        if base + margin <= row < base + table.WINDOW_ROWS - margin:
+            return
+        new_base = table.ClampBaseRow(row - table.WINDOW_ROWS // 2)
+        if new_base == base:
+            return
+        delta = new_base - base
+        top = self._top_row(grid) - base
+        cursor_row, cursor_col = grid.GridCursorRow, grid.GridCursorCol
+
+        table.SetBaseRow(new_base)
+        if cursor_row >= 0:
+            self._moving_cursor = True
+            grid.SetGridCursor(min(max(cursor_row - delta, 0), table.GetNumberRows() - 1), cursor_col)
+            self._moving_cursor = False
+        self._scroll_to_row(grid, top - delta)
+        grid.ForceRefresh()
+
+    def _update_row_scrollbar(self):
+        """ show the scroll bar over the whole file when the grid only sees a window of it """
+        table = self.grid.GetTable()
+        windowed = isinstance(table, HexGridTable) and table.IsWindowed
+        if windowed != self._row_scrollbar.IsShown():
+            self._row_scrollbar.Show(windowed)
+            self.grid.ShowScrollbars(wx.SHOW_SB_DEFAULT, wx.SHOW_SB_NEVER if windowed else wx.SHOW_SB_DEFAULT)
+            self.Layout()
+        if not windowed:
+            return
+        # the scroll bar counts in an int too, a unit is several rows on the largest files
+        shift = self._row_scroll_shift = max(table.RowCount.bit_length() - 30, 0)
+        page = self.grid.GetGridWindow().GetClientSize()[1] // max(self.grid.GetDefaultRowSize(), 1)
+        page = max(page >> shift, 1)
+        self._row_scrollbar.SetScrollbar(self._top_row(self.grid) >> shift, page,
+                                         table.RowCount >> shift, page)
+
+    def OnRowScroll(self, event):
+        row = event.GetPosition() << self._row_scroll_shift
+        self._show_row(row)
+        self._scroll_to_row(self.grid, row - self._base_row())
+        if self.compare_grid is not None:
+            self._sync_compare_scroll(self.grid)
+        self._update_minimap_view()
+
+    def LoadPatternsDialog(self):
+        """ fill the find bar with the hex patterns of a file, one per line """
+        dlg = wx.FileDialog(self, "Load hex patterns", style=wx.FD_OPEN,
+                            wildcard='Text files (*.txt)|*.txt|All files (*.*)|*.*')
+        filename = dlg.GetPath() if dlg.ShowModal() == wx.ID_OK else None
+        dlg.Destroy()
+        if not filename:
+            return
+        try:
+            patterns = SignatureMatcher.ReadPatternFile(filename)
+        except (IOError, UnicodeDecodeError) as e:
+            self.MessageBox(str(e), "Load Patterns Error", wx.OK | wx.ICON_ERROR)
+            return
+        self._find_text.SetValue(", ".join(patterns))
+        for radio in self.find_types:
+            radio.SetValue(radio.GetLabel() == SEARCH_TYPES.SignatureList)
+        self._find_text.SetFocus()
+
+    def JumpToHitDialog(self):
+        hits = self._search_hits
+        if not hits:
+            return
+        dlg = wx.TextEntryDialog(self, "Hit number (1-%d)" % len(hits), "Jump to Hit", "1")
+        res = dlg.ShowModal()
+        dlg.Destroy()
+        if res == wx.ID_OK:
+            try:
+                index = int(dlg.GetValue()) - 1
+            except ValueError:
+                return
+            self.GotoHit(index)
+
+    def _stop_search(self):
+        """ called before an edit, a search or compare still running can not follow it """
+        if self._search_worker is not None and not self._search_worker.done:
+            self._reset_search()
+        if self._compare_worker is not None and not self._compare_worker.done:
+            self._compare_worker.Cancel()
+            self._compare_worker = None
+            self._update_status(search="Compare cancelled")
+
+    def _reset_search(self):
+        if self._search_worker is not None:
+            self._search_worker.Cancel()
+        if self._search_hits is not None:
+            self._update_status(search="")
+        self._search_hits = None
+        self._search_worker = None
+        self._search_pos = None
+        self._search_pending = 0
+
+    def CancelSearch(self):
+        if self._search_worker is not None and not self._search_worker.done:
+            self._reset_search()
+            self._update_status(search="Search cancelled")
+
+    def OnSearchHits(self, count):
+        if self._search_pending:
+            self._show_hit(self._search_pending)
+
+    def OnSearchProgress(self, pos, total, count):
+        percent = pos * 100 // total if total else 100
+        self._update_status(search="Searching... %d%% (%d hits)" % (percent, count))
+
+    def OnSearchDone(self):
+        self._update_status(search="Search done (%d hits)" % len(self._search_hits))
+        if self._search_pending:
+            self._show_hit(self._search_pending)
 
     def OnFindKeyDown(self, event):
         if event.GetKeyCode() in (wx.WXK_RETURN, wx.WXK_NUMPAD_ENTER):
             self.OnFindButton(event)
             self._find_text.SetFocus()
             return
+        elif event.GetKeyCode() == wx.WXK_ESCAPE:
+            self.CancelSearch()
+            return
         event.Skip()
 
     # セルの選択時
@@ -505,6 +1089,10 @@ class HexEditor(wx.Panel):
         row = event.GetRow()
         col = event.GetCol()
 
+        if not self._moving_cursor and self._selection is not None:
+            self._set_selection_range(None)  # moving the cursor drops the selection
+            self._update_status(sel=1)
+
         addr = self.RowColToAddr(row, col)
 
         value = self.GetCellString(row, col)
@@ -514,7 +1102,15 @@ class HexEditor(wx.Panel):
             self._set_value_text(value)
             self._current_text.SetLabel("%X" % addr)
 
-        self._update_status(row=row, col=col)
+        self._update_status(row=row + self._base_row(), col=col)
+        if not self._moving_cursor:
+            # the keys scroll the grid without a scroll event, the window may have to move
+            wx.CallAfter(self._on_grid_scrolled, self.grid)
+        event.Skip()
+
+    def OnCellChanging(self, event):
+        # a running search reads the table from its thread, stop it before the cell is written
+        self._stop_search()
         event.Skip()
 
     def OnCellRightClicked(self, event):
@@ -576,8 +1172,17 @@ class HexEditor(wx.Panel):
                 self._find_text.SelectAll()
         
         elif key in (wx.WXK_F3,):
-            self.OnFindButton(event)
+            self.Find(-1 if event.ShiftDown() else 1)
             self.grid.SetFocus()
+
+        elif controlDown and key in (ord('J'), ord('j')):
+            self.JumpToHitDialog()
+
+        elif key in (wx.WXK_F8,):
+            self.GotoDifference(-1 if event.ShiftDown() else 1)
+
+        elif key in (wx.WXK_ESCAPE,):
+            self.CancelSearch()
         
         elif key in (wx.WXK_DELETE,):
             self._delete()
@@ -585,6 +1190,9 @@ class HexEditor(wx.Panel):
         elif key in (wx.WXK_INSERT,):
             self._insert()
         
+        elif event.ShiftDown() and key in self.SELECTION_KEYS:
+            self._extend_selection_by_key(key)
+
         elif key in (wx.WXK_RETURN, wx.WXK_NUMPAD_ENTER, wx.WXK_TAB):
             row, col = self.CurrentRowCol
             if col >= self.HexCols - 1:
@@ -637,24 +1245,7 @@ class HexEditor(wx.Panel):
                 max_addr = self.RowColToAddr(max_row, self.HexCols - 1)
                 self.SetSelection(min_addr, max_addr - min_addr + 1, False)
             else:
-                top_left = self.grid.GetSelectionBlockTopLeft()
-                bottom_right = self.grid.GetSelectionBlockBottomRight()
-                cells = self.grid.GetSelectedCells()
-
-                result = []
-                result.append(top_left)
-                result.append(bottom_right)
-                result.append(cells)
-                addrs = []
-                #addrs = [self.RowColToAddr(row, col) for (row, col) in top_left + bottom_right + cells]
-                #addrs = [self.RowColToAddr(row, col) for (row, col) in result]
-                
-                if addrs:
-                    min_addr = min(addrs)
-                    max_addr = max(addrs)
-                    self.SetSelection(min_addr, max_addr - min_addr + 1, False)
-                else:
-                    self._update_status(sel=1)
+                self._update_status(sel=self._selection[1] if self._selection else 1)
 
         self._in_selecting = False
         if callable(callback):
@@ -678,9 +1269,70 @@ class HexEditor(wx.Panel):
 
     def OnGridLeftDown(self, event):
         start_pos = self._client_to_scroll_pos(event.X, event.Y)
+        if event.ShiftDown():
+            self.ExtendSelection(self.RowColToAddr(*self.grid.XYToCell(*start_pos)))
+            return
         self._grid_selecting_start = self.grid.XYToCell(*start_pos)
         event.Skip()
 
+    def ExtendSelection(self, addr):
+        """ select from the anchor to addr, the anchor is the cursor when no
+        selection was extended yet, the cursor stays where the selection started
+        """
+        anchor = self._selection_anchor
+        if anchor is None:
+            anchor = self.CurrentAddr
+        start, end = min(anchor, addr), max(anchor, addr)
+        self._set_selection_range((start, end - start + 1))
+        self._selection_anchor = anchor
+        self._update_status(sel=end - start + 1)
+
+    SELECTION_KEYS = (wx.WXK_LEFT, wx.WXK_RIGHT, wx.WXK_UP, wx.WXK_DOWN,
+                      wx.WXK_PAGEUP, wx.WXK_PAGEDOWN, wx.WXK_HOME, wx.WXK_END)
+
+    def _extend_selection_by_key(self, key):
+        """ Shift with a cursor key moves the end of the selection away from its anchor """
+        if not self.Length:
+            return
+        anchor = self._selection_anchor
+        if anchor is None:
+            focus = self.CurrentAddr
+        else:
+            start, length = self._selection
+            focus = start + length - 1 if start == anchor else start
+
+        cols = self.HexCols
+        page = max(self.grid.GetGridWindow().GetClientSize()[1] // max(self.grid.GetDefaultRowSize(), 1) - 1, 1)
+        if key == wx.WXK_LEFT:
+            focus -= 1
+        elif key == wx.WXK_RIGHT:
+            focus += 1
+        elif key == wx.WXK_UP:
+            focus -= cols
+        elif key == wx.WXK_DOWN:
+            focus += cols
+        elif key == wx.WXK_PAGEUP:
+            focus -= page * cols
+        elif key == wx.WXK_PAGEDOWN:
+            focus += page * cols
+        elif key == wx.WXK_HOME:
+            focus -= focus % cols
+        elif key == wx.WXK_END:
+            focus += cols - 1 - focus % cols
+        focus = self._check_addr_in_range(focus)
+
+        self.ExtendSelection(focus)
+        self._show_row(focus // cols)
+        self.grid.MakeCellVisible(*self.AddrToRowCol(focus))
+
+    def OnRangeSelect(self, event):
+        """ the selection is a range of bytes drawn by the table, the grid only keeps
+        the rows selected on the row labels, which _set_selection turns into bytes
+        """
+        if event.Selecting() and (event.GetLeftCol() > 0 or event.GetRightCol() < self.HexCols - 1):
+            wx.CallAfter(self.grid.ClearSelection)
+        event.Skip()
+
     def OnGridLeftUp(self, event):
         event.Skip()
         wx.CallAfter(self._set_selection, callback=self._reset_grid_selecting)
@@ -727,15 +1379,57 @@ class HexEditor(wx.Panel):
         cell_coords = self.grid.CellToRect(row, col)
         y = cell_coords.y / ppunit[1]  # convert pixels to scroll units
         scrollPageSize = self.grid.GetScrollPageSize(wx.VERTICAL)
-        scroll_coords = (0, y - scrollPageSize / 2)
+        scroll_coords = (0, max(int(y - scrollPageSize // 2), 0))
         self.grid.Scroll(*scroll_coords)
+        self._update_minimap_view()
+        self._update_row_scrollbar()
+
+    def ToggleMinimap(self):
+        show = not self.minimap.IsShown()
+        self.minimap.Show(show)
+        self.Layout()
+        self.AutoSize()
+        if show:
+            self.minimap.Recompute()
+            self._update_minimap_view()
+
+    def OnMinimapJump(self, addr):
+        self._show_row(addr // self.HexCols)
+        row, col = self.AddrToRowCol(addr)
+        self.JumpTo(row, 0)
+
+    def _update_minimap_view(self):
+        """ show the rows of the grid on the minimap """
+        if not self or not self.minimap.IsShown():
+            return
+        top = self.grid.GetViewStart()[1] * self.grid.GetScrollPixelsPerUnit()[1]
+        height = self.grid.GetGridWindow().GetClientSize()[1]
+        first = max(self.grid.YToRow(top), 0)
+        last = self.grid.YToRow(top + height)
+        if last < 0:
+            last = self.grid.GetNumberRows()
+        base = self._base_row()
+        self.minimap.SetView((first + base) * self.HexCols, (last + base + 1) * self.HexCols)
+
+    @staticmethod
+    def _binary_format():
+        return wx.DataFormat(BINARY_DATA_FORMAT)
 
     def _get_data_from_clipboard(self):
-        data = wx.TextDataObject()
-        wx.TheClipboard.Open()
-        success = wx.TheClipboard.GetData(data)
-        wx.TheClipboard.Close()
-        return data.GetText() if success else None
+        """ return raw bytes copied by a hex editor, hex text from other apps or None """
+        if not wx.TheClipboard.Open():
+            return None
+        try:
+            if wx.TheClipboard.IsSupported(self._binary_format()):
+                data = wx.CustomDataObject(self._binary_format())
+                if wx.TheClipboard.GetData(data):
+                    return bytes(data.GetData())
+            data = wx.TextDataObject()
+            if wx.TheClipboard.GetData(data):
+                return data.GetText()
+        finally:
+            wx.TheClipboard.Close()
+        return None
 
     def _cut(self):
         self._copy()
@@ -750,10 +1444,17 @@ class HexEditor(wx.Panel):
             start = self.CurrentAddr
             length = 1
 
-        binary = self.grid.GetTable().GetText(start, length)
-        wx.TheClipboard.Open()
-        wx.TheClipboard.SetData(wx.TextDataObject(binary))
-        wx.TheClipboard.Close()
+        table = self.grid.GetTable()
+        data = wx.DataObjectComposite()
+        raw = wx.CustomDataObject(self._binary_format())
+        raw.SetData(table.GetBinary(start, length))
+        data.Add(raw, True)
+        if length <= self.CLIPBOARD_TEXT_LIMIT:
+            # hex text for other apps, twice the size of the data
+            data.Add(wx.TextDataObject(table.GetText(start, length)))
+        if wx.TheClipboard.Open():
+            wx.TheClipboard.SetData(data)
+            wx.TheClipboard.Close()
 
     def _paste(self):
         self._delete(False)
@@ -771,8 +1472,9 @@ class HexEditor(wx.Panel):
             length = 1
 
         table = self.grid.GetTable()
+        self._stop_search()
         table.DeleteRange(start, length)
-        self._set_grid_table(table)
+        self._refresh_grid()
 
     def _insert(self):
         data = self._get_data_from_clipboard()
@@ -780,29 +1482,30 @@ class HexEditor(wx.Panel):
             start = self.CurrentAddr
 
             table = self.grid.GetTable()
-            data = re.sub("[\n\r]\S{8} ", "", data)
-            data = re.sub(r'\s+', '', data)
-            if data:
-                if len(data) % 2:
-                    data = data[:-1]
-                try:
+            try:
+                self._stop_search()
+                if isinstance(data, bytes):
+                    table.InsertRange(start, data)
+                else:
                     table.InsertText(start, data)
-                    self._set_grid_table(table)
-                except Exception as e:
-                    self.MessageBox(str(e), "Insert Data Error", wx.OK | wx.ICON_ERROR)
+                self._refresh_grid()
+            except Exception as e:
+                self.MessageBox(str(e), "Insert Data Error", wx.OK | wx.ICON_ERROR)
 
     def Undo(self):
         table = self.grid.GetTable()
+        self._stop_search()
         res = table.Undo()
         if res is True:
-            self._set_grid_table(table)
+            self._refresh_grid()
         elif res is False:
-            self.Refresh()
+            self.grid.ForceRefresh()
 
     def Redo(self):
         table = self.grid.GetTable()
+        self._stop_search()
         res = table.Redo()
         if res is True:
-            self._set_grid_table(table)
+            self._refresh_grid()
         elif res is False:
-            self.Refresh()
\ No newline at end of file
+            self.grid.ForceRefresh()
\ No newline at end of file
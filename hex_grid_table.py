@@ -1,40 +1,35 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 import wx
-import ctypes
-import re
-import binascii
 import wx.grid as wxgrid
 import struct
-from enum import Enum
 from wx.py import dispatcher
 from search_types import SEARCH_TYPES
+from hex_document import HexDocument
+from interval_set import IntervalSet
+from row_cache import RowCache
+from memory_pool import POOL
+import instrument
 
 
 class HexGridTable(wx.grid.PyGridTableBase):
-    class Actions:
-        EditCell = "EditCell"
-        RemoveCells = "RemoveCells"
-        InsertCells = "InsertCells"
-
-    def __init__(self, binary, length=None, hex_cols=16):
+    """ grid view of a HexDocument, the document holds the bytes, the undo
+    journal and the searches, the table only adds rows, cells and colours
+    """
+    Actions = HexDocument.Actions
+    # rows the grid sees at once, rows x row height must fit the int of the grid pixel maths
+    WINDOW_ROWS = 0x100000
+
+    def __init__(self, binary=b"", length=None, hex_cols=16, document=None):
         #wx.grid.PyGridTableBase.__init__(self)
         wx.grid.GridTableBase.__init__(self)
 
-        if length is None:
-            self.length = len(binary)
-        else:
-            self.length = length
-        if self.length < 0:
-            self.length = 0
-
         self.hex_cols = hex_cols
         self.cols_labels = ["%X" % i for i in range(self.hex_cols)] + ["        Dump       "]
 
-        self.buffer = ctypes.create_string_buffer(self.length)
-        ctypes.memmove(self.buffer, binary, self.length)
-
-        self._string = None
+        self.document = document if document is not None else HexDocument(binary, length)
+        self.document.AddListener(self._on_edit)
+        self._row_cache = RowCache(self._get_value_by_addr, self.hex_cols)
 
         self._dump_cell_attr = wxgrid.GridCellAttr()
         self._dump_cell_attr.SetReadOnly(True)
@@ -49,304 +44,268 @@ class HexGridTable(wx.grid.PyGridTableBase):
         self._changed_cell_attr = wxgrid.GridCellAttr()
         self._changed_cell_attr.SetBackgroundColour("#F2F5A9")
         self._changed_cell_attr.SetTextColour("red")
+        self._selected_attr = wxgrid.GridCellAttr()
+        self._selected_attr.SetBackgroundColour(wx.SystemSettings.GetColour(wx.SYS_COLOUR_HIGHLIGHT))
+        self._selected_attr.SetTextColour(wx.SystemSettings.GetColour(wx.SYS_COLOUR_HIGHLIGHTTEXT))
+        self._selection = (-1, -1)  # drawn by GetAttr, the grid itself selects nothing
 
-        self._changed_attr = {}
+        # alternate groups of 4 columns are shaded
+        self._col_attrs = [self._alt_cell_attr if (col // 4) % 2 else None for col in range(self.hex_cols)]
 
         self._changed_range = (-1, -1)
-        self._undo_list = []
-        self._redo_list = []
+
+        self._diff_attr = wxgrid.GridCellAttr()
+        self._diff_attr.SetBackgroundColour("#FFC8C8")
+        self._diff_ranges = IntervalSet()  # bytes that differ from the compared file
+
+        self._base_row = 0  # row of the buffer shown as row 0 of the grid
+
+        POOL.Register(self)
+
+    @classmethod
+    def FromFile(cls, path, length=None, hex_cols=16):
+        """ map the file read-only, bytes are paged in when the grid asks for them
+        and edits go to the piece table overlay
+        """
+        return cls(hex_cols=hex_cols, document=HexDocument.FromFile(path, length))
+
+    def Close(self):
+        """ release the mapped file and the undo journal """
+        POOL.Unregister(self)
+        self.document.RemoveListener(self._on_edit)
+        self.document.Close()
+
+    @property
+    def RamSize(self):
+        return self.document.RamSize + self._row_cache.RamSize
+
+    @property
+    def MappedSize(self):
+        return self.document.MappedSize
+
+    def Trim(self):
+        """ called by the memory pool while the table is off screen """
+        self._row_cache.Clear()
+        self.document.Trim()
+
+    @property
+    def buffer(self):
+        return self.document.buffer
+
+    @property
+    def path(self):
+        return self.document.path
+
+    @property
+    def length(self):
+        return self.document.length
 
     @property
     def String(self):
-        if self._string is None:
-            self._string = ctypes.string_at(self.buffer, self.length)
-        return self._string
+        return self.document.String
 
     def _get_value_by_row_col(self, row, col, length=1):
         addr = row * self.hex_cols + col
         return self._get_value_by_addr(addr, length)
 
     def _get_value_by_addr(self, addr, length=1):
-        end = addr + length
-        if addr + length > self.length:
-            end = self.length
-        return self.buffer[addr:end]
-
-    def _set_value_by_addr(self, addr, value):
-        if addr > self.length:
-            return False
-        if addr == self.length:  # append one byte
-            self.InsertRange(self.length, value)
-        else:  # change one byte
-            self.buffer[addr] = value
-        self._string = None  # reset string
-        return True
+        return self.document.buffer.read(addr, length)
 
     def addr_to_row_col(self, addr):
-        return addr / self.hex_cols, addr % self.hex_cols
+        return addr // self.hex_cols - self._base_row, addr % self.hex_cols
 
     def row_col_to_addr(self, row, col):
-        return row * self.hex_cols + col
+        return (row + self._base_row) * self.hex_cols + col
+
+    @property
+    def RowCount(self):
+        """ rows of the whole buffer, the grid is only given WINDOW_ROWS of them """
+        return (self.length + self.hex_cols) // self.hex_cols
+
+    @property
+    def IsWindowed(self):
+        return self.RowCount > self.WINDOW_ROWS
+
+    @property
+    def BaseRow(self):
+        return self._base_row
+
+    def ClampBaseRow(self, row):
+        """ the nearest base row that keeps the window inside the buffer """
+        return min(max(row, 0), max(self.RowCount - self.WINDOW_ROWS, 0))
+
+    def SetBaseRow(self, row):
+        """ show the buffer from row on, the number of grid rows does not change,
+        the view only has to be repainted
+        """
+        self._base_row = self.ClampBaseRow(row)
 
     def _in_changed_range(self, addr):
         return self._changed_range[0] <= addr < self._changed_range[1]
 
     def Reset_Attr(self):
-        self._changed_attr = {}
+        self.document.ClearChanged()
+
+    def SetDiffRanges(self, ranges):
+        """ highlight the (start, end) ranges found by a compare, () clears them """
+        self._diff_ranges = IntervalSet()
+        for start, end in ranges:
+            self._diff_ranges.add(start, end)
+
+    @property
+    def DiffRanges(self):
+        """ the compare ranges, they follow inserts and deletes made since the compare """
+        return self._diff_ranges
+
+    def SetSelectionRange(self, start=-1, length=0):
+        self._selection = (start, start + length) if length > 0 else (-1, -1)
 
     def GetNumberCols(self):
         return self.hex_cols + 1
 
     def GetNumberRows(self):
-        return (self.length + self.hex_cols) / self.hex_cols
+        return max(min(self.RowCount - self._base_row, self.WINDOW_ROWS), 0)
 
     def GetColLabelValue(self, col):
         return self.cols_labels[col]
 
     def GetRowLabelValue(self, row):
-        return "0x%X " % (row * self.hex_cols)
+        return "0x%X " % ((row + self._base_row) * self.hex_cols)
 
     def IsEmptyCell(self, row, col):
-        addr = row * self.hex_cols + col
+        addr = (row + self._base_row) * self.hex_cols + col
         if addr >= self.length:
             return True
         return False
 
+    @instrument.timed("GetAttr")
     def GetAttr(self, row, col, kind=None):
         if col == self.hex_cols:  # disable cell editor for Dump col
             self._dump_cell_attr.IncRef()
             return self._dump_cell_attr
+        row += self._base_row
         addr = row * self.hex_cols + col
 
         if addr > self.length:  # disable cell editor for cells > length
             self._dump_cell_attr.IncRef()
             return self._dump_cell_attr
 
-        if addr in self._changed_attr:  # return changed cells attr first
-            attr = self._changed_attr[addr]
-            if attr:
-                attr.IncRef()
-            return attr
+        if self._selection[0] <= addr < self._selection[1]:  # selection over everything
+            attr = self._selected_attr
+        elif self.document.IsChanged(addr):  # return changed cells attr first
+            attr = self._changed_cell_attr
+        elif addr in self._diff_ranges:  # differs from the compared file
+            attr = self._diff_attr
         elif self._in_changed_range(addr):  # return range change attr
-            self._range_attr.IncRef()
-            return self._range_attr
+            attr = self._range_attr
         elif row and not (row % 0x20):   # return pager attr
-            self._page_row_attr.IncRef()
-            return self._page_row_attr
-        elif col in [4, 5, 6, 7, 12, 13, 14, 15]:   # return range change attr
-            self._alt_cell_attr.IncRef()
-            return self._alt_cell_attr
+            attr = self._page_row_attr
+        else:
+            attr = self._col_attrs[col]  # None for plain columns
 
-        # return None for others
+        if attr:
+            attr.IncRef()
+        return attr
 
     def SetAttr(self, attr, row, col):
-        addr = row * self.hex_cols + col
-        if addr in self._changed_attr:   # decrease ref for saved attr
-            old_attr = self._changed_attr[addr]
-            if old_attr:
-                old_attr.DecRef()
-        self._changed_attr[addr] = attr  # save changed cell attr
+        """ only the changed cell attr is kept, any other attr clears the highlight """
+        addr = (row + self._base_row) * self.hex_cols + col
+        self.document.SetChanged(addr, attr is self._changed_cell_attr)
+        if attr:
+            attr.DecRef()  # the reference given to the table is not kept
 
+    @instrument.timed("GetValue")
     def GetValue(self, row, col):
+        cells, dump = self._row_cache.Get(row + self._base_row)
         if col == self.hex_cols:  # dump col
-            row_values = self._get_value_by_row_col(row, 0, 16)
-            #row_values = ["%c" % val if 0x20 <= ord(val) <= 0x7E else "." for val in row_values if val]
-            row_values = ["%c" % val if 0x20 <= val <= 0x7E else "." for val in row_values if val]
-            
-            return "  " + "".join(row_values)
-        else:
-            val = self._get_value_by_row_col(row, col, 1)
-            return val and "%02X" % ord(val)
+            return dump
+        elif col < len(cells):
+            return cells[col]
+        return ""
 
     def SetValue(self, row, col, value):
         if col == self.hex_cols:
             pass
         else:
-            addr = row * self.hex_cols + col
+            addr = (row + self._base_row) * self.hex_cols + col
             value = struct.pack('B', int(value, 16))
-            #value = chr(int("6c", 16))
-
-            attr = self.GetAttr(row, col)
-            saved_val = self._get_value_by_addr(addr)
-
-            in_range = addr < self.length  # add undo for addr < length
-
-            if saved_val != value and self._set_value_by_addr(addr, value):
-                self._changed_cell_attr.IncRef()
-                self.SetAttr(self._changed_cell_attr, row, col)
-                if in_range:
-                    self._add_undo_action(self.Actions.EditCell, (addr, saved_val, attr))
-                else:
-                    if col == self.hex_cols - 1:
-                        # this is the last row/col, append a row
-                        msg = wxgrid.GridTableMessage(self,
-                                wxgrid.GRIDTABLE_NOTIFY_ROWS_APPENDED,
-                                1)
-                        self.GetView().ProcessTableMessage(msg)
+            # an append past the last column adds its row through _on_edit
+            self.document.Patch(addr, value)
 
     def SaveFile(self, output):
         """ output must be a file like object supports 'write' """
-        output.write(ctypes.string_at(self.buffer, self.length))
+        self.document.SaveFile(output)
+
+    def SaveToPath(self, path, in_place=True):
+        self.document.SaveToPath(path, in_place)
 
     def GetBinary(self, start=0, length=None):
-        if length is None:
-            length = self.length
-        if start + length > self.length:
-            length = self.length - length
-        return ctypes.string_at(ctypes.addressof(self.buffer) + start, length)
+        return self.document.GetBinary(start, length)
 
     def GetText(self, start=0, length=None):
-        return binascii.b2a_hex(self.GetBinary(start, length)).upper()
+        return self.document.GetText(start, length)
 
     def InsertText(self, start, text):
-        value = binascii.a2b_hex(text)
-        self.InsertRange(start, value)
-
-    def _delete_range(self, start, length):
-        if start >= self.length:
-            return ""
-        self._changed_range = (-1, -1)
-
-        deleted_data = ctypes.create_string_buffer(length)
-        buf_addr = ctypes.addressof(self.buffer)
-        if start + length > self.length:
-            length = self.length - length
-            ctypes.memmove(deleted_data, buf_addr + start, length)
-            self.length -= length
-        else:
-            ctypes.memmove(deleted_data, buf_addr + start, length)
-            ctypes.memmove(buf_addr + start, buf_addr + start + length, self.length - length - start)
-            self.length -= length
-            self.Reset_Attr()
-
-        self._string = None  # reset string
-
-        dispatcher.send("HexEditor.Changed", sender=self.GetView())
-
-        return deleted_data
+        self.document.InsertText(start, text)
 
     def DeleteRange(self, start, length):
-        deleted_data = self._delete_range(start, length)
-
-        self._add_undo_action(self.Actions.RemoveCells, (start, length, deleted_data))
-
-    def _insert_range(self, start, value):
-        if start >= self.length:
-            start = self.length
-
-        length = len(value)
-        new_buf = ctypes.create_string_buffer(self.length + length)
-        new_buf_addr = ctypes.addressof(new_buf)
-
-        old_addr = ctypes.addressof(self.buffer)
-
-        self._changed_range = (start, start + length)
-
-        ctypes.memmove(new_buf_addr, old_addr, start)  # copy range before insert point
-        ctypes.memmove(new_buf_addr + start, value, length)  # copy insertion value
-        # copy range after insert point
-        ctypes.memmove(new_buf_addr + start + length, old_addr + start, self.length - start)
-
-        self.buffer = new_buf
-        self.length += length
-
-        self.Reset_Attr()
-
-        self._string = None  # reset string
-
-        dispatcher.send("HexEditor.Changed", sender=self.GetView())
-
-        return start
+        self.document.DeleteRange(start, length)
 
     def InsertRange(self, start, value):
-        start = self._insert_range(start, value)
+        self.document.InsertRange(start, value)
 
-        self._add_undo_action(self.Actions.InsertCells, (start, value))
+    def Undo(self):
+        """ return True when bytes were inserted or deleted, False for cell edits """
+        return self.document.Undo()
 
-    def _add_undo_action(self, action, data):
-        self._undo_list.append((action, data))
-        if action == self.Actions.EditCell:
-            return False
-        return True
+    def Redo(self):
+        return self.document.Redo()
 
-    def _add_redo_action(self, action, data):
-        self._redo_list.append((action, data))
-        if action == self.Actions.EditCell:
-            return False
-        return True
+    def FindIter(self, text, find_type=SEARCH_TYPES.Hexadecimal, progress=None):
+        """ return a iter of (start, end) """
+        return self.document.FindIter(text, find_type, progress)
 
-    def Undo(self):
-        try:
-            item = self._undo_list.pop()
-            action, data = item
-            action, data = self.Do(action, data)
-            if action is False:
-                return self._add_undo_action(*item)
-            elif action is not None:
-                return self._add_redo_action(action, data)
-        except IndexError:
-            return
+    def FindRegex(self, regex, start=0, end=None, progress=None):
+        return self.document.FindRegex(regex, start, end, progress)
 
-    def Redo(self):
-        try:
-            item = self._redo_list.pop()
-            action, data = item
-            action, data = self.Do(action, data)
-            if action is False:
-                return self._add_redo_action(*item)
-            if action is not None:
-                return self._add_undo_action(action, data)
-        except IndexError:
-            return
+    def GetHitIndex(self, text, find_type=SEARCH_TYPES.Hexadecimal):
+        return self.document.GetHitIndex(text, find_type)
 
-    def Do(self, action, data):
-        if action == self.Actions.EditCell:
-            addr, value, attr = data
-            row, col = self.addr_to_row_col(addr)
-            saved_value = self._get_value_by_addr(addr)
-            saved_attr = self.GetAttr(row, col)
-            if self._set_value_by_addr(addr, value):
-                self.SetAttr(attr, row, col)
-                return  self.Actions.EditCell, (addr, saved_value, saved_attr)
-            return False, False
-
-        elif action == self.Actions.RemoveCells:
-            start, length, deleted_data = data
-            try:
-                start = self._insert_range(start, deleted_data)
-                return self.Actions.InsertCells, (start, deleted_data)
-            except:
-                return False, False
-
-        elif action == self.Actions.InsertCells:
-            start, deleted_data = data
-            try:
-                deleted_data = self._delete_range(start, len(deleted_data))
-                return self.Actions.RemoveCells, (start, len(deleted_data), deleted_data)
-            except:
-                return False, False
-
-        return None, None
-
-    def FindIter(self, text, find_type=SEARCH_TYPES.Hexadecimal):
-        """ return a iter """
-        if find_type == SEARCH_TYPES.Hexadecimal:
-            text = binascii.a2b_hex(text)
-            regex = re.escape(text)
-
-        elif find_type == SEARCH_TYPES.NormalText:
-            regex = re.escape(text).encode()
-
-        elif find_type == SEARCH_TYPES.RegexText:
-            regex = text.encode()
+    def _on_edit(self, start, removed, inserted):
+        """ removed bytes at start were replaced by inserted bytes """
+        self._row_cache.Invalidate(start, removed, inserted)
+        POOL.Fit()  # the edit may have grown the add blocks or the undo journal
+        if removed == inserted:
+            return  # overwritten cells, the view repaints them
+        self._diff_ranges.shift(start, removed, inserted)
 
+        if inserted:
+            self._changed_range = (start, start + inserted)
         else:
-            raise Exception("unsupported search type")
+            self._changed_range = (-1, -1)
+        old_length = self.length + removed - inserted
+        self._notify_rows(start, (old_length + self.hex_cols) // self.hex_cols)
 
-        return self.FindRegex(regex)
+        dispatcher.send("HexEditor.Changed", sender=self.GetView())
 
-    def FindRegex(self, regex):
-        return re.finditer(regex, self.String)
+    def _notify_rows(self, start, old_rows):
+        """ tell the view how many rows an insert or delete at start added or removed,
+        the rows below start only need a repaint of the visible part of the grid
+        """
+        # a delete may leave the window past the end of the buffer
+        self._base_row = self.ClampBaseRow(self._base_row)
+        view = self.GetView()
+        if view is None:
+            return
+        old_rows = min(max(old_rows - self._base_row, 0), self.WINDOW_ROWS)
+        rows = self.GetNumberRows()
+        pos = min(max(start // self.hex_cols + 1 - self._base_row, 0), old_rows)
+        if rows > old_rows:
+            msg = wxgrid.GridTableMessage(self, wxgrid.GRIDTABLE_NOTIFY_ROWS_INSERTED, pos, rows - old_rows)
+            view.ProcessTableMessage(msg)
+        elif rows < old_rows:
+            msg = wxgrid.GridTableMessage(self, wxgrid.GRIDTABLE_NOTIFY_ROWS_DELETED, min(pos, rows), old_rows - rows)
+            view.ProcessTableMessage(msg)
 
     def GetBuffer(self):
-        return self.buffer
\ No newline at end of file
+        return self.document.buffer
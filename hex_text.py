@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+import re
+import binascii
+from search_types import SEARCH_TYPES
+
+# the address column of a pasted dump, "\n0000FFF0 "
+ADDRESS_PREFIX = re.compile(r"[\n\r]\S{8} ")
+WHITESPACE = b" \t\r\n\v\f"
+PARSE_CHUNK = 0x100000
+
+
+def parse_hex_text(text, chunk_size=PARSE_CHUNK):
+    """ decode hex text (optionally a dump with address columns) to a bytearray,
+    a chunk at a time so no full-size intermediate string is built,
+    a trailing odd digit is dropped
+    """
+    chunk_size = max(chunk_size, 0x100)  # room for an address prefix
+    output = bytearray()
+    carry = b""
+    pos = 0
+    end = len(text)
+    while pos < end:
+        stop = min(pos + chunk_size, end)
+        if stop < end:
+            # keep an address prefix starting near the chunk end in one piece
+            tail = text.rfind("\n", stop - 10, stop)
+            tail = max(tail, text.rfind("\r", stop - 10, stop))
+            if tail > pos:
+                stop = tail
+        chunk = ADDRESS_PREFIX.sub("", text[pos:stop])
+        digits = carry + chunk.encode("ascii").translate(None, WHITESPACE)
+        even = len(digits) & ~1
+        output += binascii.a2b_hex(digits[:even])
+        carry = digits[even:]
+        pos = stop
+    return output
+
+
+def search_text(text, find_type):
+    """ the text of a search as the document takes it, hex digits lose the spaces
+    and line breaks they are typed or pasted with
+    """
+    if find_type == SEARCH_TYPES.Hexadecimal:
+        return re.sub(r"\s+", "", text)
+    return text
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+import bisect
+from array import array
+from stream_search import find_spans
+
+
+class HitIndex(object):
+    """ (start, end) of every hit of one search, stored in two array('Q')
+
+    max_length is the length of a literal pattern, with it an edit only
+    rescans the bytes around the edited range and shifts the hits after it.
+    Regex hits have no bounded length, their index is cleared by edits.
+
+    The shift is lazy: the hits from index _pending on are stored _shift bytes
+    before their address, so an edit only rewrites the hits between it and that
+    boundary, not every hit after it.
+    """
+    RESCAN_WINDOW = 0x10000
+
+    def __init__(self, regex, max_length=None):
+        self.regex = regex
+        self.max_length = max_length
+        self.starts = array('Q')
+        self.ends = array('Q')
+        self.complete = False
+        self._pending = 0
+        self._shift = 0
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self.starts)
+        shift = self._shift if index >= self._pending else 0
+        return self.starts[index] + shift, self.ends[index] + shift
+
+    def Add(self, start, end):
+        """ hits must be added in address order """
+        if self._pending >= len(self.starts):
+            self._shift = 0  # no hit is shifted
+        self.starts.append(start - self._shift)
+        self.ends.append(end - self._shift)
+
+    def Clear(self):
+        self.starts = array('Q')
+        self.ends = array('Q')
+        self.complete = False
+        self._pending = 0
+        self._shift = 0
+
+    def _bisect(self, values, addr, left=False):
+        """ bisect_right (bisect_left when left) of addr in starts or ends """
+        find = bisect.bisect_left if left else bisect.bisect_right
+        pending, shift = self._pending, self._shift
+        if not shift or pending >= len(values):
+            return find(values, addr)
+        first = values[pending] + shift
+        if first > addr or (left and first == addr):
+            return find(values, addr, 0, pending)
+        return find(values, addr - shift, pending, len(values))
+
+    def _add(self, low, high, step):
+        for values in (self.starts, self.ends):
+            values[low:high] = array('Q', [value + step for value in values[low:high]])
+
+    def Next(self, addr):
+        """ return the index of the first hit starting after addr, or None """
+        index = self._bisect(self.starts, addr)
+        if index < len(self.starts):
+            return index
+
+    def Prev(self, addr):
+        """ return the index of the last hit starting before addr, or None """
+        index = self._bisect(self.starts, addr, left=True) - 1
+        if index >= 0:
+            return index
+
+    def IndexOf(self, addr):
+        """ return the index of the hit starting at addr, or None """
+        index = self._bisect(self.starts, addr, left=True)
+        if index < len(self.starts) and self[index][0] == addr:
+            return index
+
+    def Update(self, buffer, start, removed, inserted):
+        """ follow an edit that replaced removed bytes at start with inserted bytes,
+        return False when the index had to be cleared
+        """
+        if self.max_length is None:
+            self.Clear()
+            return False
+
+        margin = self.max_length - 1
+        low = max(start - margin, 0)
+        high = start + removed + margin
+
+        # hits touching [low, high) are dropped and found again by the rescan
+        first = self._bisect(self.ends, low)
+        last = self._bisect(self.starts, high, left=True)
+        if first < last:
+            low = min(low, self[first][0])
+            high = max(high, self[last - 1][1])
+
+        delta = inserted - removed
+        count = len(self.starts)
+        # with no hit after the edit a new one has to start before it ends, the
+        # bytes after that were searched already and did not match
+        end = high + delta + self.max_length if last == count else None
+        found = []
+        resync = count
+        for span in find_spans(buffer, self.regex, low, end, window=self.RESCAN_WINDOW):
+            if span[0] >= high + delta:
+                # past the edit, stop once the scan is in step with the old hits again
+                while last < count and self[last][0] + delta < span[0]:
+                    last += 1
+                if last < count and self[last][0] + delta == span[0]:
+                    resync = last
+                    break
+            found.append(span)
+
+        # only the hits between the edit and the lazy shift boundary are rewritten
+        pending = self._pending
+        if pending <= resync:
+            if pending < first and self._shift:
+                self._add(pending, first, self._shift)
+            pending = first + len(found)
+        else:
+            if delta:
+                self._add(resync, pending, delta)
+            pending += len(found) - (resync - first)
+        self.starts[first:resync] = array('Q', [hit[0] for hit in found])
+        self.ends[first:resync] = array('Q', [hit[1] for hit in found])
+        self._pending = pending
+        self._shift += delta
+        return True
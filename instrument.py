@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+""" optional counters and timers around the hot paths
+
+HEXEDITOR_PROFILE=1 turns them on, HEXEDITOR_PROFILE=path.json also dumps them
+to that file at exit. They are switched at import time: when off, timed()
+returns the function itself so the hot paths run exactly as without it.
+"""
+import os
+import json
+import time
+import atexit
+import functools
+import threading
+
+_setting = os.environ.get("HEXEDITOR_PROFILE", "")
+ENABLED = _setting not in ("", "0")
+DUMP_PATH = _setting if _setting.endswith(".json") else None
+
+
+class Counters(object):
+    """ calls, seconds and bytes per timed name, and the repaints they happened in """
+
+    def __init__(self):
+        self._lock = threading.Lock()  # searches and transmissions run on worker threads
+        self.Reset()
+
+    def Reset(self):
+        self._stats = {}  # name => [calls, seconds, bytes, max seconds]
+        self.repaints = 0
+        self.started = time.time()
+
+    def Add(self, name, seconds, size=0):
+        with self._lock:
+            stat = self._stats.get(name)
+            if stat is None:
+                stat = self._stats[name] = [0, 0.0, 0, 0.0]
+            stat[0] += 1
+            stat[1] += seconds
+            stat[2] += size
+            if seconds > stat[3]:
+                stat[3] = seconds
+
+    def Repaint(self):
+        self.repaints += 1
+
+    def Snapshot(self):
+        """ return {name: {calls, seconds, bytes, per_call, max, per_repaint}} """
+        with self._lock:
+            stats = dict((name, list(stat)) for name, stat in self._stats.items())
+        result = {}
+        for name, (calls, seconds, size, longest) in sorted(stats.items()):
+            result[name] = {
+                "calls": calls,
+                "seconds": seconds,
+                "bytes": size,
+                "per_call": seconds / calls if calls else 0.0,
+                "max": longest,
+                "per_repaint": float(calls) / self.repaints if self.repaints else None,
+            }
+        return result
+
+    def StatusText(self, names=("GetValue", "GetAttr")):
+        """ one line for the status bar """
+        snapshot = self.Snapshot()
+        parts = []
+        for name in names:
+            stat = snapshot.get(name)
+            if stat:
+                parts.append("%s %d/paint %.1fus" % (name, stat["per_repaint"] or 0, stat["per_call"] * 1e6))
+        return " ".join(parts) or "no calls"
+
+    def Dump(self, path):
+        with open(path, "w") as output:
+            json.dump({
+                "elapsed": time.time() - self.started,
+                "repaints": self.repaints,
+                "stats": self.Snapshot(),
+            }, output, indent=2)
+
+
+COUNTERS = Counters()
+
+
+def timed(name, size=None):
+    """ decorator counting the calls of a function and the time spent in it,
+    size(result, *args, **kwargs), called with the arguments of the call, returns
+    the bytes it copied
+    """
+    def decorator(func):
+        if not ENABLED:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            result = func(*args, **kwargs)
+            COUNTERS.Add(name, time.perf_counter() - start, size(result, *args, **kwargs) if size else 0)
+            return result
+        return wrapper
+    return decorator
+
+
+def timed_iter(name):
+    """ decorator for functions returning an iterator, the time is spent in the
+    iteration and every item counts as a call
+    """
+    def decorator(func):
+        if not ENABLED:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            iterator = iter(func(*args, **kwargs))
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    COUNTERS.Add(name, time.perf_counter() - start)
+                    return
+                COUNTERS.Add(name, time.perf_counter() - start)
+                yield item
+        return wrapper
+    return decorator
+
+
+if ENABLED and DUMP_PATH:
+    atexit.register(lambda: COUNTERS.Dump(DUMP_PATH))
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+import bisect
+
+
+class IntervalSet(object):
+    """ sorted, merged set of half-open [start, end) address ranges """
+
+    def __init__(self):
+        self._starts = []
+        self._ends = []
+
+    def __len__(self):
+        return len(self._starts)
+
+    def __iter__(self):
+        return zip(self._starts, self._ends)
+
+    def __bool__(self):
+        return bool(self._starts)
+
+    def add(self, start, end):
+        if start >= end:
+            return
+        # every range touching [start, end) is merged into one
+        first = bisect.bisect_left(self._ends, start)
+        last = bisect.bisect_right(self._starts, end)
+        if first < last:
+            start = min(start, self._starts[first])
+            end = max(end, self._ends[last - 1])
+        self._starts[first:last] = [start]
+        self._ends[first:last] = [end]
+
+    def remove(self, start, end):
+        if start >= end:
+            return
+        first = bisect.bisect_right(self._ends, start)
+        last = bisect.bisect_left(self._starts, end)
+        if first >= last:
+            return
+        starts, ends = [], []
+        if self._starts[first] < start:  # keep the head of the first range
+            starts.append(self._starts[first])
+            ends.append(start)
+        if self._ends[last - 1] > end:  # keep the tail of the last range
+            starts.append(end)
+            ends.append(self._ends[last - 1])
+        self._starts[first:last] = starts
+        self._ends[first:last] = ends
+
+    def contains(self, addr):
+        index = bisect.bisect_right(self._starts, addr) - 1
+        return index >= 0 and addr < self._ends[index]
+
+    __contains__ = contains
+
+    def shift(self, start, removed, inserted):
+        """ follow an edit that replaced removed addresses at start with inserted ones,
+        the inserted addresses are not part of the set
+        """
+        self.remove(start, start + removed)
+        delta = inserted - removed
+        if not delta:
+            return
+        starts, ends = self._starts, self._ends
+        index = bisect.bisect_left(starts, start)
+        if index and ends[index - 1] > start:
+            # an insertion inside a range splits it
+            starts.insert(index, start)
+            ends.insert(index, ends[index - 1])
+            ends[index - 1] = start
+        for i in range(index, len(starts)):
+            starts[i] += delta
+            ends[i] += delta
+        if index and index < len(starts) and ends[index - 1] == starts[index]:
+            # a deletion brought two ranges together
+            ends[index - 1] = ends[index]
+            del starts[index]
+            del ends[index]
+
+    def next_range(self, addr):
+        """ return the first (start, end) starting after addr, None when there is none """
+        index = bisect.bisect_right(self._starts, addr)
+        if index < len(self._starts):
+            return self._starts[index], self._ends[index]
+
+    def prev_range(self, addr):
+        """ return the last (start, end) starting before addr, None when there is none """
+        index = bisect.bisect_left(self._starts, addr) - 1
+        if index >= 0:
+            return self._starts[index], self._ends[index]
+
+    def clear(self):
+        self._starts = []
+        self._ends = []
+
+    @property
+    def Total(self):
+        """ number of addresses covered """
+        return sum(end - start for start, end in self)
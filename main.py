@@ -1,14 +1,19 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 import os
-import re
 import sys
+import time
 import wx
-import wx.lib.agw.genericmessagedialog as gmd
+import wx.aui
 from hex_editor import HexEditor
-from hex_grid_table import HexGridTable
-from valid_types import VALID_TYPES
-from search_types import SEARCH_TYPES
+
+# HEXEDITOR_TIMING=1 prints the startup milestones to stderr
+START_TIME = time.time()
+
+
+def log_startup(event):
+  if os.environ.get("HEXEDITOR_TIMING"):
+    sys.stderr.write("%s: %.1f ms\n" % (event, (time.time() - START_TIME) * 1000))
 
 
 if sys.version_info[:2] < (2, 7):
@@ -25,15 +30,79 @@ class HexEditorFrame(wx.Frame):
       parent=parent, title="HexEditor", size=(720, 700))
     sizer = wx.BoxSizer(wx.VERTICAL)
 
-    self.editor = HexEditor(self)
+    # one page per file, the documents share the memory budget of memory_pool.POOL
+    self.notebook = wx.aui.AuiNotebook(self, style=wx.aui.AUI_NB_DEFAULT_STYLE & ~wx.aui.AUI_NB_TAB_SPLIT)
+    self.notebook.Bind(wx.aui.EVT_AUINOTEBOOK_PAGE_CHANGED, self.OnPageChanged)
+    self.notebook.Bind(wx.aui.EVT_AUINOTEBOOK_PAGE_CLOSE, self.OnPageClose)
+    self._loading = {}  # editor => path of the file being opened in it
+    self.NewEditor()
 
-    sizer.Add(self.editor, 1, wx.EXPAND)
+    sizer.Add(self.notebook, 1, wx.EXPAND)
     self.SetSizer(sizer)
 
     self.CenterOnScreen()
 
-  def OpenFile(self, filename):
-      self.editor.LoadFile(filename)
+  @property
+  def editor(self):
+    return self.notebook.GetCurrentPage()
+
+  def NewEditor(self, title="untitled"):
+    editor = HexEditor(self.notebook, on_open_files=self.OpenFiles)
+    self.notebook.AddPage(editor, title, select=True)
+    return editor
+
+  def _is_blank(self, editor):
+    """ a page nothing was loaded into nor typed in """
+    return (editor.Path is None and editor not in self._loading
+            and not editor.grid.GetTable().document.CanUndo)
+
+  def OpenFiles(self, filenames, selection=None):
+    for filename in filenames:
+      self.OpenFile(filename, selection)
+
+  def OpenFile(self, filename, selection=None):
+    """ open the file in a new page, a file already open is only shown,
+    selection is (start, length) of the bytes to show
+    """
+    path = os.path.abspath(filename)
+    for index in range(self.notebook.GetPageCount()):
+      page = self.notebook.GetPage(index)
+      if page.Path == path or self._loading.get(page) == path:
+        self.notebook.SetSelection(index)
+        if selection and page.Path == path:
+          page.SetSelection(selection[0], selection[1], True)
+        return
+    editor = self.editor
+    if editor is None or not self._is_blank(editor):
+      editor = self.NewEditor()
+    self._loading[editor] = path
+    self.notebook.SetPageText(self.notebook.GetPageIndex(editor), os.path.basename(path))
+
+    def on_loaded():
+      self._loading.pop(editor, None)
+      if selection:
+        editor.SetSelection(selection[0], selection[1], True)
+      log_startup("file loaded")
+    # the frame is already on screen, the file is opened in the background
+    editor.LoadFileAsync(filename, on_loaded)
+
+  def OnPageChanged(self, event):
+    editor = self.editor
+    for index in range(self.notebook.GetPageCount()):
+      page = self.notebook.GetPage(index)
+      if page is not editor:
+        page.DeactivateDocument()
+    if editor is not None:
+      editor.ActivateDocument()
+    event.Skip()
+
+  def OnPageClose(self, event):
+    editor = self.notebook.GetPage(event.GetSelection())
+    self._loading.pop(editor, None)
+    editor.CloseDocument()
+    if self.notebook.GetPageCount() == 1:
+      wx.CallAfter(self.NewEditor)  # keep an empty page to drop files on
+    event.Skip()
 
 class HexEditorApp(wx.App):
 
@@ -41,13 +110,15 @@ class HexEditorApp(wx.App):
     self.mainFrame = HexEditorFrame(None)
     self.mainFrame.Show()
     self.SetTopWindow(self.mainFrame)
+    log_startup("frame shown")
+    wx.CallAfter(log_startup, "first idle")
     return True
 
   def main(*args):
     application = HexEditorApp(None)
     if len(args[0]) > 1 and os.path.isfile(args[0][1]):
       application.OpenFile(filename=args[0][1])
-      application.MainLoop()
+    application.MainLoop()
 
   def OpenFile(self, filename=''):
     if filename:
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+from collections import OrderedDict
+
+
+class MemoryPool(object):
+    """ one memory budget shared by every open document
+
+    A client has RamSize (bytes only held in memory: add blocks, undo records,
+    caches), MappedSize (bytes of a file mapping that may be paged in) and Trim()
+    which drops what it can rebuild: caches, undo payloads go to the spill file
+    and the mapped pages are handed back to the file they were read from.
+    When the pool goes over budget the least recently used clients are trimmed
+    first, the active clients never are. A trimmed mapping is not counted again
+    until its client is touched.
+    """
+    BUDGET = 0x40000000  # 1 GB
+
+    def __init__(self, budget=None):
+        self.budget = self.BUDGET if budget is None else budget
+        self._clients = OrderedDict()  # client => trimmed, least recently used first
+        self._active = ()
+
+    def __len__(self):
+        return len(self._clients)
+
+    def Register(self, client):
+        self._clients[client] = False
+        self.Fit()
+
+    def Unregister(self, client):
+        self._clients.pop(client, None)
+        self._active = tuple(active for active in self._active if active is not client)
+
+    def Touch(self, *clients):
+        """ clients are the documents on screen, they become the most recently used """
+        for client in clients:
+            if client in self._clients:
+                self._clients[client] = False
+                self._clients.move_to_end(client)
+        self._active = clients
+        self.Fit()
+
+    def _charge(self, client, trimmed):
+        return client.RamSize + (0 if trimmed else client.MappedSize)
+
+    @property
+    def Used(self):
+        return sum(self._charge(client, trimmed) for client, trimmed in self._clients.items())
+
+    def Fit(self):
+        """ trim cold clients until the pool is within budget """
+        used = self.Used
+        if used <= self.budget:
+            return
+        for client, trimmed in list(self._clients.items()):
+            if client in self._active or trimmed:
+                continue
+            before = self._charge(client, False)
+            client.Trim()
+            self._clients[client] = True
+            used -= before - self._charge(client, True)
+            if used <= self.budget:
+                return
+
+
+POOL = MemoryPool()
@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+import time
+import threading
+import wx
+
+
+class MinimapCancelled(Exception):
+    pass
+
+
+def block_colour(entropy, zeros, text):
+    """ zero filled blocks are dark, text green, the rest grey turning red
+    as the entropy goes up to compressed or encrypted data
+    """
+    if zeros > 0.9:
+        return wx.Colour(40, 40, 60)
+    if text > 0.9:
+        return wx.Colour(70, 170, 70)
+    level = max(entropy - 4.0, 0.0) / 4.0  # below 4 bits per byte is plain data
+    if entropy > 7.2:
+        return wx.Colour(210, 50, 40)
+    return wx.Colour(int(200 + 40 * level), int(200 - 80 * level), int(200 - 80 * level))
+
+
+class Minimap(wx.Panel):
+    """ a strip beside the grid drawing the entropy and byte class of every block
+    of the document, a click jumps the grid there
+
+    The blocks are only computed while the strip is on screen: a hidden page
+    starts no worker and a page that is switched away is paused, its first paint
+    resumes it. The colour of every pixel row is kept until the stats change.
+    """
+    WIDTH = 24
+    DELAY = 500  # ms between the last edit and the update of the touched blocks
+    REFRESH_INTERVAL = 0.2
+
+    def __init__(self, parent, on_jump=None):
+        wx.Panel.__init__(self, parent, -1, size=(self.WIDTH, -1), style=wx.FULL_REPAINT_ON_RESIZE)
+        self.SetMinSize((self.WIDTH, -1))
+        self.SetToolTip("Entropy: grey low, red high / green text / dark zero fill")
+        self._on_jump = on_jump
+        self._document = None
+        self._stats = None  # BlockStats, made by the first computation
+        self._view = (0, 0)  # addresses shown by the grid
+        self._thread = None
+        self._cancel = threading.Event()
+        self._timer = None
+        self._pixels = None  # (height, colour or None of every pixel row)
+
+        self.Bind(wx.EVT_PAINT, self.OnPaint)
+        self.Bind(wx.EVT_ERASE_BACKGROUND, lambda event: None)
+        self.Bind(wx.EVT_LEFT_DOWN, self.OnLeftDown)
+        self.Bind(wx.EVT_MOTION, self.OnMotion)
+
+    def SetDocument(self, document):
+        self.Stop()
+        if self._document is not None:
+            self._document.RemoveListener(self._on_edit)
+        self._document = document
+        self._stats = None
+        self._pixels = None
+        document.AddListener(self._on_edit)
+        self.Recompute()
+
+    def SetView(self, start, end):
+        if (start, end) != self._view:
+            self._view = (start, end)
+            self.Refresh()
+
+    def _on_edit(self, start, removed, inserted):
+        self.Stop()
+        if self._stats is not None:
+            self._stats.Invalidate(start, removed, inserted)
+        self._pixels = None
+        if self._timer is not None and self._timer.IsRunning():
+            self._timer.Restart(self.DELAY)
+        else:
+            self._timer = wx.CallLater(self.DELAY, self.Recompute)
+
+    def Stop(self):
+        """ wait for the worker, it reads the buffer and writes the stats """
+        self._cancel.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def Pause(self):
+        """ the page is switched away, the next paint on screen resumes the work """
+        self.Stop()
+        if self._timer is not None:
+            self._timer.Stop()
+
+    def ReleaseDocument(self):
+        self.Pause()
+        if self._document is not None:
+            self._document.RemoveListener(self._on_edit)
+            self._document = None
+
+    def Recompute(self):
+        if self._document is None or not self.IsShownOnScreen():
+            return
+        if self._stats is None and not self._document.length:
+            return  # nothing to draw for an empty buffer
+        self.Stop()
+        if self._stats is None:
+            from block_stats import BlockStats  # numpy is loaded with the first file, not at startup
+            self._stats = BlockStats()
+        span = self._document.buffer.snapshot()
+        self._stats.Resize(len(span))  # the worker does not resize the lists painted here
+        self._pixels = None
+        self._cancel = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(span, self._cancel))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self, span, cancel):
+        last_refresh = [0]
+
+        def progress(pos, total):
+            if cancel.is_set():
+                raise MinimapCancelled()
+            now = time.time()
+            if now - last_refresh[0] >= self.REFRESH_INTERVAL:
+                last_refresh[0] = now
+                wx.CallAfter(self._refresh, cancel)
+
+        try:
+            self._stats.Update(span, progress)
+        except MinimapCancelled:
+            return
+        wx.CallAfter(self._refresh, cancel)
+
+    def _refresh(self, cancel):
+        if self and not cancel.is_set():
+            self._pixels = None
+            self.Refresh()
+
+    def _busy(self):
+        return (self._thread is not None and self._thread.is_alive()) or \
+            (self._timer is not None and self._timer.IsRunning())
+
+    def _pixel_colours(self, height):
+        """ the colour of every pixel row, None for rows with no block computed yet """
+        stats = self._stats
+        if stats is None:
+            return [None] * height, self._length() > 0
+        count = len(stats)
+        colours = []
+        stale = count * stats.block_size < self._length()  # not resized by a worker yet
+        if not count:
+            return [None] * height, stale
+        for y in range(height):
+            first = y * count // height
+            last = max((y + 1) * count // height, first + 1)
+            valid = [index for index in range(first, last) if stats.IsValid(index)]
+            stale = stale or len(valid) < last - first
+            if not valid:
+                colours.append(None)  # not computed yet
+                continue
+            n = float(len(valid))
+            colours.append(block_colour(sum(stats.entropy[i] for i in valid) / n,
+                                        sum(stats.zeros[i] for i in valid) / n,
+                                        sum(stats.text[i] for i in valid) / n))
+        return colours, stale
+
+    def _length(self):
+        return self._document.length if self._document is not None else 0
+
+    def OnPaint(self, event):
+        dc = wx.BufferedPaintDC(self)
+        width, height = self.GetClientSize()
+        dc.SetBackground(wx.Brush(self.GetBackgroundColour()))
+        dc.Clear()
+        if height <= 0:
+            return
+        if self._pixels is None or self._pixels[0] != height:
+            self._pixels = (height,) + self._pixel_colours(height)
+        height, colours, stale = self._pixels
+        if stale and self._document is not None and not self._busy():
+            wx.CallAfter(self.Recompute)  # shown for the first time or after a pause
+        for y, colour in enumerate(colours):
+            if colour is not None:
+                dc.SetPen(wx.Pen(colour))
+                dc.DrawLine(0, y, width, y)
+
+        # the part of the file the grid shows
+        length = self._length()
+        if length:
+            top = self._view[0] * height // length
+            bottom = max(self._view[1] * height // length, top + 2)
+            dc.SetPen(wx.Pen(wx.BLACK, 2))
+            dc.SetBrush(wx.TRANSPARENT_BRUSH)
+            dc.DrawRectangle(1, top, width - 1, bottom - top)
+
+    def OnLeftDown(self, event):
+        self._jump(event.GetY())
+        event.Skip()
+
+    def OnMotion(self, event):
+        if event.Dragging() and event.LeftIsDown():
+            self._jump(event.GetY())
+        event.Skip()
+
+    def _jump(self, y):
+        height = self.GetClientSize()[1]
+        length = self._length()
+        if height <= 0 or not length or self._on_jump is None:
+            return
+        y = min(max(y, 0), height - 1)
+        self._on_jump(y * length // height)
@@ -0,0 +1,329 @@
+# -*- coding: utf-8 -*-
+import bisect
+from itertools import accumulate
+from operator import itemgetter
+import instrument
+
+
+class Span(object):
+    """ pieces cut out of a piece table, the bytes are shared, not copied,
+    so inserting a span back costs nothing but the piece list update
+    """
+
+    def __init__(self, pieces=()):
+        self.pieces = list(pieces)
+        self.length = sum(piece[2] for piece in self.pieces)
+
+    def __len__(self):
+        return self.length
+
+    def iter_chunks(self, start=0, end=None):
+        """ yield memoryviews over the pieces covering [start, end) """
+        if end is None or end > self.length:
+            end = self.length
+        pos = 0
+        for src, piece_start, length in self.pieces:
+            if pos + length > start and pos < end:
+                first = max(start - pos, 0)
+                last = min(end - pos, length)
+                yield memoryview(src)[piece_start + first:piece_start + last]
+            pos += length
+            if pos >= end:
+                break
+
+    def tobytes(self):
+        return b"".join(self.iter_chunks())
+
+    @property
+    def RamSize(self):
+        """ bytes held in add blocks, the original buffer is backed by its file """
+        return sum(length for src, start, length in self.pieces if isinstance(src, bytearray))
+
+
+class PieceTable(object):
+    """ byte sequence made of pieces over a read-only original buffer and
+    append-only add blocks, inserts and deletes only touch the piece list
+
+    The pieces are kept in leaves of about NODE_SIZE pieces. A leaf has the offsets
+    of its pieces from the start of the leaf and the table has the start of every
+    leaf, so an edit rewrites the offsets of one leaf and the leaf starts (an
+    overwrite not even those), never the offsets of every piece after the edit.
+    """
+    ADD_BLOCK_SIZE = 0x10000
+    NODE_SIZE = 256
+
+    def __init__(self, original=b"", length=None):
+        if isinstance(original, str):
+            original = original.encode("latin-1")
+        original = memoryview(original).cast("B")
+        if length is None or length > len(original):
+            length = len(original)
+        if length < 0:
+            length = 0
+
+        # a piece is (source, start, length), the source is the original view or an add block
+        self._original = original
+        self._add_block = None
+        self._add_used = 0
+        self._add_size = 0  # bytes of every add block allocated
+        self._leaves = [[(original, 0, length)] if length else []]
+        self._offsets = [[0] if length else []]  # offset of each piece in its leaf
+        self._sizes = [length]  # bytes of each leaf
+        self._starts = [0]  # offset of each leaf in the table
+        self.length = length
+
+    def __len__(self):
+        return self.length
+
+    def _refresh(self, lo, hi, resized=True):
+        """ the pieces of the leaves lo to hi changed, rebuild their offsets, regroup
+        leaves that grew too large or too small, and the leaf starts when sizes changed
+        """
+        leaves = self._leaves
+        size = self.NODE_SIZE
+        if any(not size // 4 <= len(leaf) <= 2 * size for leaf in leaves[lo:hi + 1]):
+            lo = max(lo - 1, 0)
+            hi = min(hi + 1, len(leaves) - 1)
+            pieces = [piece for leaf in leaves[lo:hi + 1] for piece in leaf]
+            groups = [pieces[i:i + size] for i in range(0, len(pieces), size)]
+            if not groups and len(leaves) == hi - lo + 1:
+                groups = [[]]  # the table is empty
+            leaves[lo:hi + 1] = groups
+            self._offsets[lo:hi + 1] = [None] * len(groups)
+            self._sizes[lo:hi + 1] = [0] * len(groups)
+            hi = lo + len(groups) - 1
+            resized = True
+        for leaf in range(lo, hi + 1):
+            ends = list(accumulate(map(itemgetter(2), leaves[leaf])))
+            self._offsets[leaf] = [0] + ends[:-1] if ends else []
+            self._sizes[leaf] = ends[-1] if ends else 0
+        if resized:
+            ends = list(accumulate(self._sizes))
+            self._starts = [0] + ends[:-1]
+            self.length = ends[-1]
+
+    def _locate(self, pos):
+        """ return (leaf, index) of the piece that contains pos """
+        leaf = max(bisect.bisect_right(self._starts, pos) - 1, 0)
+        index = bisect.bisect_right(self._offsets[leaf], pos - self._starts[leaf]) - 1
+        return leaf, index
+
+    def _pieces_from(self, pos):
+        """ yield (source, start, length, offset in the table) of the pieces from the one
+        containing pos on
+        """
+        leaf, index = self._locate(pos)
+        while leaf < len(self._leaves):
+            base = self._starts[leaf]
+            offsets = self._offsets[leaf]
+            pieces = self._leaves[leaf]
+            for i in range(index, len(pieces)):
+                src, start, length = pieces[i]
+                yield src, start, length, base + offsets[i]
+            leaf += 1
+            index = 0
+
+    def _split(self, pos):
+        """ make a piece boundary at pos and return (leaf, index) of the piece starting there,
+        the leaves are not regrouped so positions found before stay valid
+        """
+        if pos >= self.length:
+            leaf = len(self._leaves) - 1
+            return leaf, len(self._leaves[leaf])
+        leaf, index = self._locate(pos)
+        offsets = self._offsets[leaf]
+        rel = pos - self._starts[leaf]
+        offset = rel - offsets[index]
+        if offset == 0:
+            return leaf, index
+        src, start, length = self._leaves[leaf][index]
+        self._leaves[leaf][index:index + 1] = [(src, start, offset), (src, start + offset, length - offset)]
+        offsets.insert(index + 1, rel)
+        return leaf, index + 1
+
+    def _reserve(self, length):
+        """ room for length bytes in the add blocks, return (block, start) """
+        block = self._add_block
+        if block is None or self._add_used + length > len(block):
+            block = self._add_block = bytearray(max(self.ADD_BLOCK_SIZE, length))
+            self._add_used = 0
+            self._add_size += len(block)
+        start = self._add_used
+        self._add_used += length
+        return block, start
+
+    def _put(self, pieces, index, block, start, length):
+        """ place a new piece at index, typing at the end of the last piece written
+        only grows that piece
+        """
+        if index:
+            prev_src, prev_start, prev_length = pieces[index - 1]
+            if prev_src is block and prev_start + prev_length == start:
+                pieces[index - 1] = (block, prev_start, prev_length + length)
+                return
+        pieces.insert(index, (block, start, length))
+
+    def insert(self, pos, data):
+        """ insert data at pos, return the real insertion position """
+        if pos > self.length:
+            pos = self.length
+        length = len(data)
+        if not length:
+            return pos
+
+        leaf, index = self._split(pos)
+        block, start = self._reserve(length)
+        block[start:start + length] = data
+        self._put(self._leaves[leaf], index, block, start, length)
+        self._refresh(leaf, leaf)
+        return pos
+
+    def insert_span(self, pos, span):
+        """ insert the pieces of a span cut from this or another table """
+        if pos > self.length:
+            pos = self.length
+        if not len(span):
+            return pos
+        leaf, index = self._split(pos)
+        self._leaves[leaf][index:index] = span.pieces
+        self._refresh(leaf, leaf)
+        return pos
+
+    def delete(self, pos, length):
+        """ delete length bytes at pos, return the deleted bytes as a Span """
+        if pos >= self.length or length <= 0:
+            return Span()
+        if pos + length > self.length:
+            length = self.length - pos
+
+        first_leaf, first = self._split(pos)
+        last_leaf, last = self._split(pos + length)
+        leaves = self._leaves
+        if first_leaf == last_leaf:
+            removed = leaves[first_leaf][first:last]
+            del leaves[first_leaf][first:last]
+            self._refresh(first_leaf, first_leaf)
+        else:
+            removed = leaves[first_leaf][first:]
+            del leaves[first_leaf][first:]
+            for leaf in leaves[first_leaf + 1:last_leaf]:
+                removed.extend(leaf)
+            removed.extend(leaves[last_leaf][:last])
+            del leaves[last_leaf][:last]
+            for values in (leaves, self._offsets, self._sizes, self._starts):
+                del values[first_leaf + 1:last_leaf]
+            self._refresh(first_leaf, first_leaf + 1)
+        return Span(removed)
+
+    def snapshot(self, start=0, end=None):
+        """ return a Span of [start, end) that later edits do not change, the
+        sources are never written so only the piece list is copied
+        """
+        if end is None or end > self.length:
+            end = self.length
+        # a view of its own: close() releases the view of the table, the span still
+        # reads the original buffer until it is collected
+        original = self._original[:]
+        return Span((original if src is self._original else src, piece_start, length)
+                    for src, piece_start, length in self._cut(start, end))
+
+    def _cut(self, start, end):
+        """ yield (source, start, length) of the parts of the pieces covering [start, end) """
+        if start >= end:
+            return
+        pos = start
+        for src, piece_start, piece_length, offset in self._pieces_from(start):
+            skip = pos - offset
+            count = min(piece_length - skip, end - pos)
+            yield src, piece_start + skip, count
+            pos += count
+            if pos >= end:
+                return
+
+    def replace(self, pos, data):
+        """ overwrite bytes at pos with data, the new piece takes the place of the
+        overwritten ones so the offsets of the later pieces do not move
+        """
+        length = len(data)
+        if not length:
+            return
+        if pos + length > self.length:
+            self.delete(pos, length)
+            self.insert(pos, data)
+            return
+        first_leaf, first = self._split(pos)
+        last_leaf, last = self._split(pos + length)
+        if last_leaf == first_leaf + 1 and last == 0:
+            last_leaf, last = first_leaf, len(self._leaves[first_leaf])
+        if last_leaf != first_leaf:
+            self.delete(pos, length)
+            self.insert(pos, data)
+            return
+
+        block, start = self._reserve(length)
+        block[start:start + length] = data
+        pieces = self._leaves[first_leaf]
+        del pieces[first:last]
+        self._put(pieces, first, block, start, length)
+        self._refresh(first_leaf, first_leaf, resized=False)
+
+    def iter_chunks(self, start=0, end=None):
+        """ yield memoryviews over the pieces covering [start, end) """
+        if end is None or end > self.length:
+            end = self.length
+        for src, piece_start, count in self._cut(start, end):
+            yield memoryview(src)[piece_start:piece_start + count]
+
+    def view(self, start, end, scratch):
+        """ return a memoryview over [start, end), zero-copy when the range lies in one
+        piece, otherwise the pieces are copied into scratch (a bytearray, reused by callers)
+        """
+        if end > self.length:
+            end = self.length
+        if start >= end:
+            return memoryview(b"")
+        leaf, index = self._locate(start)
+        src, piece_start, piece_length = self._leaves[leaf][index]
+        offset = start - self._starts[leaf] - self._offsets[leaf][index]
+        if offset + end - start <= piece_length:
+            return memoryview(src)[piece_start + offset:piece_start + offset + end - start]
+        pos = 0
+        for chunk in self.iter_chunks(start, end):
+            scratch[pos:pos + len(chunk)] = chunk
+            pos += len(chunk)
+        return memoryview(scratch)[:pos]
+
+    @instrument.timed("PieceTable.read", size=lambda result, *args, **kwargs: len(result))
+    def read(self, start=0, length=None):
+        if length is None:
+            length = self.length - start
+        if start < 0 or length <= 0:
+            return b""
+        return b"".join(self.iter_chunks(start, start + length))
+
+    def byte_at(self, pos):
+        """ return the byte value at pos """
+        leaf, index = self._locate(pos)
+        src, start, length = self._leaves[leaf][index]
+        return src[start + pos - self._starts[leaf] - self._offsets[leaf][index]]
+
+    def write_to(self, output):
+        """ output must be a file like object supports 'write' """
+        for chunk in self.iter_chunks():
+            output.write(chunk)
+
+    def close(self):
+        """ release the view over the original buffer """
+        try:
+            self._original.release()
+        except BufferError:
+            pass  # a view of it is still in use, it is released when collected
+
+    @property
+    def RamSize(self):
+        """ bytes of the add blocks allocated, the original buffer is backed by its file """
+        return self._add_size
+
+    @property
+    def PieceCount(self):
+        return sum(map(len, self._leaves))
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+from collections import OrderedDict
+
+# printable ascii is shown as is in the dump, other bytes as '.'
+DUMP_TABLE = bytes(byte if 0x20 <= byte <= 0x7E else 0x2E for byte in range(256))
+
+
+class RowCache(object):
+    """ LRU of formatted rows: the hex text of every cell and the dump text,
+    a row is formatted from one read with bytes.hex and bytes.translate
+    """
+
+    def __init__(self, read, hex_cols=16, size=1024):
+        """ read(addr, length) returns the bytes of the table """
+        self._read = read
+        self.hex_cols = hex_cols
+        self.size = size
+        self._rows = OrderedDict()
+
+    def Get(self, row):
+        """ return (cells, dump) of the row """
+        rows = self._rows
+        try:
+            value = rows[row]
+            rows.move_to_end(row)
+            return value
+        except KeyError:
+            pass
+
+        data = self._read(row * self.hex_cols, self.hex_cols)
+        value = (data.hex(" ").upper().split(), "  " + data.translate(DUMP_TABLE).decode("ascii"))
+        rows[row] = value
+        if len(rows) > self.size:
+            rows.popitem(last=False)
+        return value
+
+    def Invalidate(self, start, removed, inserted):
+        """ drop the rows changed when removed bytes at start were replaced by inserted bytes """
+        first = start // self.hex_cols
+        if removed == inserted:
+            last = (start + max(removed, 1) - 1) // self.hex_cols
+            for row in range(first, last + 1):
+                self._rows.pop(row, None)
+        else:
+            # every row from the edit on is shifted
+            for row in [row for row in self._rows if row >= first]:
+                del self._rows[row]
+
+    @property
+    def RamSize(self):
+        """ rough size of the cached rows, a short str takes about 64 bytes """
+        return len(self._rows) * (self.hex_cols + 2) * 64
+
+    def Clear(self):
+        self._rows.clear()
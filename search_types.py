@@ -4,4 +4,5 @@ from hex_enum import Enum
 class SEARCH_TYPES(Enum):
   Hexadecimal = "Hexadecimal"
   NormalText = "Normal Text"
-  RegexText = "Regex Text"
\ No newline at end of file
+  RegexText = "Regex Text"
+  SignatureList = "Hex Pattern List"
\ No newline at end of file
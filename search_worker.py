@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+import time
+import threading
+import wx
+
+
+class SearchCancelled(Exception):
+    pass
+
+
+class SearchWorker(object):
+    """ pull the hits of a table search into a HitIndex on a worker thread, hits,
+    progress and the end of the search are posted to the UI thread with wx.CallAfter
+    """
+    PROGRESS_INTERVAL = 0.1  # seconds between two progress updates
+
+    def __init__(self, hits, on_hits=None, on_progress=None, on_done=None):
+        self.hits = hits
+        self.error = None
+        self.done = False
+        self._on_hits = on_hits
+        self._on_progress = on_progress
+        self._on_done = on_done
+        self._cancel = threading.Event()
+        self._thread = None
+        self._last_progress = 0
+
+    def Start(self, spans):
+        """ spans is the iter returned by HexGridTable.FindRegex for the regex of the index """
+        self._thread = threading.Thread(target=self._run, args=(spans,))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def Cancel(self, wait=True):
+        self._cancel.set()
+        if wait and self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    @property
+    def Cancelled(self):
+        return self._cancel.is_set()
+
+    def Progress(self, pos, total):
+        """ progress callback for FindIter, also the point where a cancel stops the scan """
+        if self._cancel.is_set():
+            raise SearchCancelled()
+        now = time.time()
+        if self._on_progress and now - self._last_progress >= self.PROGRESS_INTERVAL:
+            self._last_progress = now
+            wx.CallAfter(self._post, self._on_progress, pos, total, len(self.hits))
+
+    def _post(self, callback, *args):
+        if not self._cancel.is_set():
+            callback(*args)
+
+    def _run(self, spans):
+        try:
+            for span in spans:
+                if self._cancel.is_set():
+                    break
+                self.hits.Add(*span)
+                if self._on_hits:
+                    wx.CallAfter(self._post, self._on_hits, len(self.hits))
+            else:
+                self.hits.complete = True
+        except SearchCancelled:
+            pass
+        except Exception as e:
+            self.error = e
+        self.done = True
+        if self._on_done:
+            wx.CallAfter(self._post, self._on_done)
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+import re
+import heapq
+import binascii
+
+DENSE_CHECK = 1024  # hits between two checks of the hit density
+DENSE_SPACING = 256  # mean bytes per hit under which the regex takes over
+
+
+class SignatureMatch(tuple):
+    """ (start, end) of a signature hit, with the span() of a regex match """
+
+    def span(self, group=0):
+        return self[0], self[1]
+
+
+class SignatureMatcher(object):
+    """ search for a list of byte patterns at once
+
+    finditer has the interface of a compiled regex as used by find_spans: the
+    hits are leftmost-longest and do not overlap. Each pattern is looked for
+    with bytes.find and a heap keeps the next hit of every pattern, so the scan
+    runs at the speed of find while the hits are sparse. When they are dense the
+    rest of the view is left to one regex of the escaped patterns, longest
+    first, which gives the same hits with less work per hit.
+    """
+
+    def __init__(self, patterns):
+        patterns = [pattern for pattern in patterns if pattern]
+        if not patterns:
+            raise Exception("no pattern to search")
+        self.patterns = patterns
+        self.max_length = max(len(pattern) for pattern in patterns)
+        self._unique = sorted(set(patterns), key=len, reverse=True)
+        self.regex = re.compile(b"|".join(re.escape(pattern) for pattern in self._unique), re.DOTALL)
+
+    def finditer(self, view, pos=0):
+        """ iterate over the hits in view from pos """
+        data = view if isinstance(view, bytes) else bytes(view)
+        pos = max(pos, 0)  # as a regex does, find would count from the end
+        heap = []
+        for pattern in self._unique:
+            start = data.find(pattern, pos)
+            if start >= 0:
+                heap.append((start, -len(pattern), pattern))
+        heapq.heapify(heap)
+
+        first = pos
+        hits = 0
+        while heap:
+            start, negative_length, pattern = heap[0]
+            if start < pos:
+                # the next hit of this pattern overlaps the last hit
+                start = data.find(pattern, pos)
+                if start < 0:
+                    heapq.heappop(heap)
+                else:
+                    heapq.heapreplace(heap, (start, negative_length, pattern))
+                continue
+            pos = start - negative_length
+            yield SignatureMatch((start, pos))
+            hits += 1
+            if hits % DENSE_CHECK == 0 and hits * DENSE_SPACING > pos - first:
+                for match in self.regex.finditer(data, pos):
+                    yield match
+                return
+
+    @classmethod
+    def FromHexText(cls, text):
+        """ patterns separated by ',', ';', '|' or new lines, spaces inside a pattern are ignored """
+        patterns = []
+        for item in re.split(r"[,;|\r\n]+", text):
+            item = re.sub(r"\s+", "", item)
+            if item:
+                patterns.append(binascii.a2b_hex(item))
+        return cls(patterns)
+
+    @staticmethod
+    def ReadPatternFile(path):
+        """ one hex pattern per line, text after '#' is a comment """
+        patterns = []
+        with open(path, "r") as pattern_file:
+            for line in pattern_file:
+                line = line.split("#", 1)[0].strip()
+                if line:
+                    patterns.append(line)
+        return patterns
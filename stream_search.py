@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+import re
+
+SEARCH_WINDOW = 0x400000
+SEARCH_OVERLAP = 0x10000
+
+
+def find_spans(buffer, regex, start=0, end=None, window=SEARCH_WINDOW, overlap=SEARCH_OVERLAP,
+               progress=None):
+    """ yield (start, end) of the non-overlapping matches of regex in buffer[start:end]
+
+    buffer is scanned in windows of window + overlap bytes, so only one scratch
+    buffer is allocated whatever the size of the buffer. A match that starts in
+    the overlap is left to the next window, a match that runs into the end of
+    the window is searched again from its start in the next window.
+    progress(pos, end) is called after every window.
+    """
+    pattern = regex if hasattr(regex, "finditer") else re.compile(regex)
+    if end is None or end > len(buffer):
+        end = len(buffer)
+
+    scratch = bytearray(window + overlap)
+    pos = start
+    min_start = start  # matches can not start before the end of the previous one
+    while pos < end:
+        win_end = min(pos + window + overlap, end)
+        limit = pos + window
+        last = win_end == end
+        next_pos = limit
+
+        view = buffer.view(pos, win_end, scratch)
+        for match in pattern.finditer(view, min_start - pos):
+            match_start, match_end = match.span()
+            match_start += pos
+            match_end += pos
+            if not last:
+                if match_start >= limit:
+                    break
+                if match_end >= win_end and match_start > pos:
+                    # the match may go on past the window, retry from its start
+                    next_pos = match_start
+                    break
+            yield match_start, match_end
+            min_start = match_end if match_end > match_start else match_end + 1
+        pos = max(next_pos, min_start) if next_pos == limit else next_pos
+        if progress:
+            progress(min(pos, end), end)
@@ -0,0 +1,463 @@
+# -*- coding: utf-8 -*-
+""" the buffer, search, undo, hash and compare code checked against plain
+python references, run with pytest from this directory
+"""
+import os
+import re
+import zlib
+import random
+import hashlib
+import binascii
+import pytest
+from piece_table import PieceTable
+from interval_set import IntervalSet
+from stream_search import find_spans
+from hit_index import HitIndex
+from signature_search import SignatureMatcher
+from undo_journal import UndoJournal, SpilledSpan
+from hash_tree import HashTree, crc32_combine, crc32_shift_table
+from file_compare import diff_ranges
+from hex_text import parse_hex_text, search_text
+from hex_document import HexDocument
+
+
+def random_bytes(rng, length, alphabet=b"ab\x00\xff"):
+    return bytes(rng.choice(alphabet) for _ in range(length))
+
+
+def edit(rng, table, reference, alphabet=b"ab\x00\xff"):
+    """ apply one random edit to the table and to the bytearray reference,
+    return (start, removed, inserted)
+    """
+    pos = rng.randint(0, len(reference))
+    op = rng.random()
+    if op < 0.35:
+        data = random_bytes(rng, rng.randint(1, 9), alphabet)
+        table.insert(pos, data)
+        reference[pos:pos] = data
+        return pos, 0, len(data)
+    if op < 0.7 and pos < len(reference):
+        length = min(rng.randint(1, 9), len(reference) - pos)
+        table.delete(pos, length)
+        del reference[pos:pos + length]
+        return pos, length, 0
+    if pos < len(reference):
+        data = random_bytes(rng, min(rng.randint(1, 5), len(reference) - pos), alphabet)
+        table.replace(pos, data)
+        reference[pos:pos + len(data)] = data
+        return pos, len(data), len(data)
+    return pos, 0, 0
+
+
+def test_piece_table_edits():
+    rng = random.Random(1)
+    for trial in range(30):
+        PieceTable.NODE_SIZE = rng.choice([4, 8, 256])  # small leaves split and merge often
+        try:
+            reference = bytearray(random_bytes(rng, rng.randint(0, 500)))
+            table = PieceTable(bytes(reference))
+            for step in range(300):
+                edit(rng, table, reference)
+                if step % 25 == 0:
+                    start = rng.randint(0, len(reference))
+                    end = rng.randint(start, len(reference))
+                    assert table.read(start, end - start) == bytes(reference[start:end])
+                    assert bytes(table.view(start, end, bytearray(end - start))) == bytes(reference[start:end])
+                    if start < len(reference):
+                        assert table.byte_at(start) == reference[start]
+                    table.insert_span(start, table.snapshot(start, min(end, start + 50)))
+                    reference[start:start] = reference[start:min(end, start + 50)]
+            assert len(table) == len(reference)
+            assert table.read() == bytes(reference)
+        finally:
+            PieceTable.NODE_SIZE = 256
+
+
+def test_piece_table_snapshot_is_stable():
+    table = PieceTable(b"0123456789")
+    span = table.snapshot(2, 8)
+    table.replace(3, b"xy")
+    table.delete(0, 4)
+    table.insert(1, b"abc")
+    assert span.tobytes() == b"234567"
+
+
+def test_snapshot_outlives_closed_document(tmp_path):
+    # a transmission is not joined when its page closes, it goes on reading the mapping
+    path = tmp_path / "data.bin"
+    data = random_bytes(random.Random(9), 5000)
+    path.write_bytes(data)
+    document = HexDocument.FromFile(str(path))
+    span = document.buffer.snapshot(100, 4000)
+    document.Close()
+    assert span.tobytes() == data[100:4000]
+
+
+def test_interval_set_shift():
+    rng = random.Random(2)
+    for trial in range(200):
+        size = 60
+        members = set()
+        ranges = IntervalSet()
+        for _ in range(rng.randint(0, 8)):
+            start = rng.randint(0, size)
+            end = rng.randint(start, size)
+            ranges.add(start, end)
+            members.update(range(start, end))
+        start = rng.randint(0, size)
+        removed = rng.randint(0, size - start)
+        inserted = rng.randint(0, 10)
+        ranges.shift(start, removed, inserted)
+
+        # addresses before the edit stay, the removed ones go, the later ones move
+        delta = inserted - removed
+        expected = set(addr for addr in members if addr < start)
+        expected.update(addr + delta for addr in members if addr >= start + removed)
+        assert set(addr for begin, end in ranges for addr in range(begin, end)) == expected
+        pairs = list(ranges)
+        assert all(begin < end for begin, end in pairs)
+        assert all(pairs[i][1] < pairs[i + 1][0] for i in range(len(pairs) - 1)), "ranges are merged"
+
+
+def test_find_spans_windows():
+    rng = random.Random(3)
+    for pattern in (re.escape(b"aba"), b"a+b", b"b(ab)*a", re.escape(b"\x00\xff\x00")):
+        regex = re.compile(pattern)
+        for trial in range(40):
+            data = random_bytes(rng, rng.randint(0, 400))
+            table = PieceTable(data)
+            window = rng.choice([4, 7, 16, 64])
+            overlap = rng.choice([8, 16, 32])
+            start = rng.randint(0, len(data))
+            end = rng.randint(start, len(data))
+            expected = [(m.start() + start, m.end() + start) for m in regex.finditer(data[start:end])]
+            # a match longer than the overlap can be cut by a window edge, the windows only
+            # promise the reference result for the bounded patterns
+            got = list(find_spans(table, regex, start, end, window=window, overlap=overlap))
+            if pattern in (re.escape(b"aba"), re.escape(b"\x00\xff\x00")):
+                assert got == expected
+            else:
+                assert all(start <= a < b <= end for a, b in got)
+
+
+def test_hit_index_follows_edits():
+    rng = random.Random(4)
+    signatures = [b"ab", b"bba", b"aaab"]
+    references = (
+        (re.compile(re.escape(b"aba")), 3, lambda data: [m.span() for m in re.finditer(b"aba", data)]),
+        (SignatureMatcher(signatures), 4, lambda data: naive_signatures(data, signatures)),
+    )
+    for pattern, length, find in references:
+        for trial in range(40):
+            reference = bytearray(random_bytes(rng, rng.randint(0, 300), b"ab"))
+            table = PieceTable(bytes(reference))
+            index = HitIndex(pattern, length)
+            for hit in find_spans(table, pattern):
+                index.Add(*hit)
+            index.complete = True
+            for step in range(40):
+                start, removed, inserted = edit(rng, table, reference, b"ab")
+                assert index.Update(table, start, removed, inserted)
+                expected = find(bytes(reference))
+                assert [index[i] for i in range(len(index))] == expected
+                addr = rng.randint(0, len(reference))
+                following = [i for i, hit in enumerate(expected) if hit[0] > addr]
+                assert index.Next(addr) == (following[0] if following else None)
+
+
+def test_hit_index_regex_is_cleared():
+    table = PieceTable(b"abcabc")
+    index = HitIndex(re.compile(b"a.c"))
+    for hit in find_spans(table, index.regex):
+        index.Add(*hit)
+    assert not index.Update(table, 0, 0, 1)
+    assert len(index) == 0
+
+
+def naive_signatures(data, patterns):
+    """ leftmost-longest, non overlapping """
+    hits = []
+    pos = 0
+    while pos < len(data):
+        lengths = [len(p) for p in patterns if data.startswith(p, pos)]
+        if lengths:
+            hits.append((pos, pos + max(lengths)))
+            pos += max(lengths)
+        else:
+            pos += 1
+    return hits
+
+
+def test_signature_matcher():
+    rng = random.Random(5)
+    for trial in range(100):
+        patterns = [random_bytes(rng, rng.randint(1, 5), b"abc") for _ in range(rng.randint(1, 6))]
+        data = random_bytes(rng, rng.randint(0, 200), b"abc")
+        matcher = SignatureMatcher(patterns)
+        assert [m.span() for m in matcher.finditer(data)] == naive_signatures(data, patterns)
+        assert list(find_spans(PieceTable(data), matcher, window=16, overlap=8)) == naive_signatures(data, patterns)
+
+
+def test_signature_matcher_dense_hits():
+    # enough hits for the regex to take over, the spans go on the same
+    data = b"\0" * 20000 + b"ab\0\x01" * 500
+    patterns = [b"\0\0\0\0", b"\0\0", b"\0\x01", b"ab"]
+    matcher = SignatureMatcher(patterns)
+    assert [m.span() for m in matcher.finditer(data)] == naive_signatures(data, patterns)
+    assert [m.span() for m in matcher.finditer(data, -4)] == naive_signatures(data, patterns)
+
+
+def test_signature_hex_text():
+    matcher = SignatureMatcher.FromHexText("4D 5A, 50 4B 03 04\n7f454c46")
+    assert matcher.patterns == [b"MZ", b"PK\x03\x04", b"\x7fELF"]
+
+
+def add_block_span(data):
+    """ a span over an add block, the bytes only the journal keeps alive """
+    table = PieceTable()
+    table.insert(0, data)
+    return table.snapshot()
+
+
+def test_undo_journal_spills():
+    size = UndoJournal.SPILL_MIN
+    journal = UndoJournal(budget=size * 3)
+    payloads = [bytes([i]) * size for i in range(6)]
+    for i, payload in enumerate(payloads):
+        journal.PushUndo(i, (add_block_span(payload),))
+        assert journal.RamSize <= journal.budget
+    spilled = [isinstance(record[1][0], SpilledSpan) for record in journal._undo]
+    assert any(spilled), "the oldest payloads went to the spill file"
+    for i in reversed(range(6)):
+        action, data = journal.PopUndo()
+        assert action == i and data[0].tobytes() == payloads[i]
+    assert not journal.CanUndo
+
+
+def test_undo_journal_detach():
+    original = bytearray(b"0123456789")
+    journal = UndoJournal()
+    journal.PushUndo("delete", (PieceTable(original).snapshot(2, 6), add_block_span(b"xy")))
+    journal.Detach()
+    original[:] = b"-" * 10  # the original buffer (a closed mapping) is no longer read
+    action, (removed, inserted) = journal.PopUndo()
+    assert removed.tobytes() == b"2345" and inserted.tobytes() == b"xy"
+
+
+def test_undo_journal_drops_oldest_small_records():
+    journal = UndoJournal(budget=100)
+    for i in range(10):
+        journal.PushUndo(i, (b"x" * 30,))
+    assert journal.RamSize <= 100
+    actions = []
+    while journal.CanUndo:
+        actions.append(journal.PopUndo()[0])
+    assert actions == [9, 8, 7]
+
+
+def test_document_undo_redo():
+    rng = random.Random(6)
+    original = random_bytes(rng, 2000)
+    document = HexDocument(original)
+    document._journal.budget = 0x100  # every payload large enough goes to the spill file
+    states = [original]
+    for step in range(60):
+        pos = rng.randint(0, document.length)
+        if rng.random() < 0.5:
+            document.InsertRange(pos, random_bytes(rng, rng.randint(1, 300)))
+        elif pos < document.length:
+            document.DeleteRange(pos, min(rng.randint(1, 300), document.length - pos))
+        else:
+            continue
+        states.append(document.GetBinary())
+    undone = 0
+    while document.CanUndo:
+        document.Undo()
+        undone += 1
+        assert document.GetBinary() == states[-1 - undone]
+    document.Redo()
+    assert document.GetBinary() == states[-undone]
+
+
+def test_document_patch_past_the_merged_record():
+    document = HexDocument(b"ABCDEFGH")
+    document.Patch(0, b"x")
+    document.Patch(0, b"yz")  # merged with the first patch, runs one byte past it
+    document.Undo()
+    assert document.GetBinary() == b"ABCDEFGH"
+
+
+def test_document_patch_undo():
+    rng = random.Random(11)
+    original = random_bytes(rng, 64)
+    document = HexDocument(original)
+    for step in range(40):
+        pos = rng.randint(0, document.length - 1)
+        document.Patch(pos, random_bytes(rng, rng.randint(1, 6)))
+    while document.CanUndo:
+        document.Undo()
+    assert document.GetBinary() == original
+
+
+def test_save_in_place(tmp_path):
+    path = str(tmp_path / "data.bin")
+    with open(path, "wb") as output:
+        output.write(b"ABCDEFGH")
+    inode = os.stat(path).st_ino
+    document = HexDocument.FromFile(path)
+    document.Patch(2, b"xy")
+    document.SaveToPath(path)
+    assert os.stat(path).st_ino == inode  # patched, not replaced
+    with open(path, "rb") as saved:
+        assert saved.read() == b"ABxyEFGH"
+    assert document.GetBinary() == b"ABxyEFGH"
+    document.Undo()
+    assert document.GetBinary() == b"ABCDEFGH"
+    document.Close()
+
+
+def test_save_keeps_the_bytes_of_a_snapshot(tmp_path):
+    # a transmission still sending: the patch goes to a new file, not into its mapping
+    path = str(tmp_path / "data.bin")
+    with open(path, "wb") as output:
+        output.write(b"ABCDEFGH")
+    inode = os.stat(path).st_ino
+    document = HexDocument.FromFile(path)
+    span = document.buffer.snapshot()
+    document.Patch(2, b"xy")
+    document.SaveToPath(path, in_place=False)
+    assert os.stat(path).st_ino != inode
+    with open(path, "rb") as saved:
+        assert saved.read() == b"ABxyEFGH"
+    assert span.tobytes() == b"ABCDEFGH"
+    document.Close()
+    assert span.tobytes() == b"ABCDEFGH"
+
+
+def test_save_replace_keeps_undo_on_the_old_mapping(tmp_path):
+    path = str(tmp_path / "data.bin")
+    with open(path, "wb") as output:
+        output.write(b"ABCDEFGH")
+    document = HexDocument.FromFile(path)
+    document.InsertRange(4, b"xyz")
+    document.DeleteRange(0, 2)
+
+    def detach():
+        raise AssertionError("the rename did not fail, nothing to detach")
+    document._journal.Detach = detach
+    document.SaveToPath(path)
+    with open(path, "rb") as saved:
+        assert saved.read() == b"CDxyzEFGH"
+    while document.CanUndo:
+        document.Undo()
+    assert document.GetBinary() == b"ABCDEFGH"
+    assert sorted(os.listdir(str(tmp_path))) == ["data.bin"]
+    document.Close()
+
+
+def test_save_replace_detaches_when_the_rename_fails(tmp_path, monkeypatch):
+    # as on Windows, a mapped file is not replaced
+    path = str(tmp_path / "data.bin")
+    with open(path, "wb") as output:
+        output.write(b"ABCDEFGH")
+    document = HexDocument.FromFile(path)
+    document.InsertRange(4, b"xyz")
+    document.DeleteRange(0, 2)
+    replace = os.replace
+    calls = []
+
+    def replace_once_mapped(source, destination):
+        calls.append(document._map is not None)
+        if document._map is not None:
+            raise OSError("file is mapped")
+        replace(source, destination)
+    monkeypatch.setattr(os, "replace", replace_once_mapped)
+    document.SaveToPath(path)
+    assert calls == [True, False]
+    with open(path, "rb") as saved:
+        assert saved.read() == b"CDxyzEFGH"
+    while document.CanUndo:
+        document.Undo()
+    assert document.GetBinary() == b"ABCDEFGH"
+    document.Close()
+
+
+def test_save_closed_document(tmp_path):
+    path = str(tmp_path / "data.bin")
+    with open(path, "wb") as output:
+        output.write(b"ABCDEFGH")
+    document = HexDocument.FromFile(path)
+    document.Close()
+    with pytest.raises(ValueError):  # the buffer is released, not a missing file object
+        document.SaveToPath(path)
+    with open(path, "rb") as saved:
+        assert saved.read() == b"ABCDEFGH"
+    assert sorted(os.listdir(str(tmp_path))) == ["data.bin"]
+
+
+def test_crc32_combine():
+    rng = random.Random(7)
+    for trial in range(50):
+        a = random_bytes(rng, rng.randint(0, 100))
+        b = random_bytes(rng, rng.randint(0, 100))
+        combined = crc32_combine(zlib.crc32(a), zlib.crc32(b), crc32_shift_table(len(b)))
+        assert combined == zlib.crc32(a + b)
+
+
+def test_hash_tree_follows_edits():
+    rng = random.Random(8)
+    reference = bytearray(random_bytes(rng, 3000))
+    table = PieceTable(bytes(reference))
+    tree = HashTree(block_size=256)
+    for step in range(30):
+        span = table.snapshot()
+        assert tree.Crc32(span) == zlib.crc32(bytes(reference))
+        assert tree.Digests(span) == (hashlib.md5(reference).hexdigest(), hashlib.sha256(reference).hexdigest())
+        tree.Invalidate(*edit(rng, table, reference))
+
+
+def test_diff_ranges():
+    rng = random.Random(9)
+    for trial in range(60):
+        a = bytearray(random_bytes(rng, rng.randint(0, 600)))
+        b = bytearray(a)
+        table_b = PieceTable(bytes(b))
+        for _ in range(rng.randint(0, 10)):
+            edit(rng, table_b, b)
+        flags = [i >= min(len(a), len(b)) or a[i] != b[i] for i in range(max(len(a), len(b)))]
+        expected = []
+        for i, differs in enumerate(flags):
+            if differs:
+                if expected and expected[-1][1] == i:
+                    expected[-1] = (expected[-1][0], i + 1)
+                else:
+                    expected.append((i, i + 1))
+        block_size = rng.choice([16, 64, 0x400000])
+        assert list(diff_ranges(PieceTable(bytes(a)), table_b.snapshot(), block_size)) == expected
+
+
+def baseline_paste(text):
+    """ the paste of the first release: whole-text regex passes """
+    text = re.sub("[\n\r]\\S{8} ", "", text)
+    text = re.sub(r"\s+", "", text)
+    if len(text) % 2:
+        text = text[:-1]
+    return binascii.a2b_hex(text)
+
+
+def test_parse_hex_text():
+    rng = random.Random(10)
+    for trial in range(60):
+        data = random_bytes(rng, rng.randint(0, 300), bytes(range(256)))
+        rows = []
+        for offset in range(0, len(data), 16):
+            digits = " ".join("%02X" % value for value in data[offset:offset + 16])
+            rows.append("%08X %s" % (offset, digits) if trial % 2 else digits)
+        text = "\n".join(rows) + ("\n" if trial % 3 else "") + ("7" if trial % 5 == 0 else "")
+        expected = baseline_paste("\n" + text if trial % 2 else text)
+        assert bytes(parse_hex_text("\n" + text if trial % 2 else text, chunk_size=rng.choice([0x100, 0x1000]))) == expected
+
+
+def test_search_text():
+    assert search_text("01 02\n03", "Hexadecimal") == "010203"
+    assert search_text("a b", "Normal Text") == "a b"
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+import os
+import time
+import socket
+import threading
+import wx
+
+
+class FileSink(object):
+    """ write to a file, a resumed transmission overwrites from its offset """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def Open(self, offset=0):
+        if offset and os.path.isfile(self.path):
+            self._file = open(self.path, "r+b")
+            self._file.seek(offset)
+            self._file.truncate()
+        else:
+            self._file = open(self.path, "wb")
+
+    def Write(self, chunk):
+        self._file.write(chunk)
+
+    def Close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class SocketSink(object):
+    """ stream to a TCP ("host:port") or unix socket, the peer is told nothing about
+    the offset of a resumed transmission
+    """
+    TIMEOUT = 30  # a stalled peer fails the transmission instead of blocking it forever
+
+    def __init__(self, address, family=socket.AF_INET):
+        self.address = address
+        self.family = family
+        self._socket = None
+
+    def Open(self, offset=0):
+        if self.family == socket.AF_INET:
+            host, port = self.address.rsplit(":", 1)
+            self._socket = socket.create_connection((host, int(port)), self.TIMEOUT)
+        else:
+            self._socket = socket.socket(self.family, socket.SOCK_STREAM)
+            self._socket.settimeout(self.TIMEOUT)
+            self._socket.connect(self.address)
+
+    def Write(self, chunk):
+        self._socket.sendall(chunk)
+
+    def Close(self):
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+
+class SerialSink(object):
+    """ write to a serial device or pty opened as a plain file descriptor """
+
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
+
+    def Open(self, offset=0):
+        self._fd = os.open(self.path, os.O_WRONLY | getattr(os, "O_NOCTTY", 0) | getattr(os, "O_BINARY", 0))
+
+    def Write(self, chunk):
+        view = memoryview(chunk)
+        while len(view):
+            view = view[os.write(self._fd, view):]
+
+    def Close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+SINKS = {
+    "file": FileSink,
+    "tcp": SocketSink,
+    "unix": lambda path: SocketSink(path, socket.AF_UNIX),
+    "serial": SerialSink,
+}
+
+
+def register_sink(scheme, factory):
+    """ factory(address) returns an object with Open(offset), Write(chunk) and Close() """
+    SINKS[scheme] = factory
+
+
+def open_sink(destination):
+    """ "scheme://address" or a file path """
+    if "://" in destination:
+        scheme, address = destination.split("://", 1)
+    else:
+        scheme, address = "file", destination
+    if scheme not in SINKS:
+        raise Exception("unsupported transport '%s'" % scheme)
+    return SINKS[scheme](address)
+
+
+class Transmission(object):
+    """ stream a Span of the table to a sink on a worker thread in CHUNK_SIZE
+    writes, progress and the end are posted to the UI thread with wx.CallAfter
+    through _post
+    """
+    CHUNK_SIZE = 0x100000
+    PROGRESS_INTERVAL = 0.2
+
+    def __init__(self, sink, span, offset=0, on_progress=None, on_done=None):
+        self.sink = sink
+        self.span = span
+        self.offset = offset  # bytes of the span already sent
+        self.error = None
+        self.done = False
+        self._on_progress = on_progress
+        self._on_done = on_done
+        self._cancel = threading.Event()
+        self._thread = None
+
+    def Start(self):
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def Cancel(self, wait=False):
+        self._cancel.set()
+        if wait and self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    @property
+    def Complete(self):
+        return self.done and self.error is None and self.offset == len(self.span)
+
+    def _post(self, callback, *args):
+        """ runs on the ui thread: nothing is called on a window destroyed meanwhile
+        (a closed page), and no progress after a cancel, the end still is
+        """
+        owner = getattr(callback, "__self__", None)
+        if owner is not None and not owner:
+            return  # a destroyed wx window is false
+        if callback is self._on_progress and self._cancel.is_set():
+            return
+        callback(*args)
+
+    def _chunks(self):
+        pos = 0
+        for chunk in self.span.iter_chunks():
+            if pos + len(chunk) <= self.offset:
+                pos += len(chunk)
+                continue
+            start = max(self.offset - pos, 0)
+            for i in range(start, len(chunk), self.CHUNK_SIZE):
+                yield chunk[i:i + self.CHUNK_SIZE]
+            pos += len(chunk)
+
+    def _run(self):
+        total = len(self.span)
+        started = time.time()
+        first_offset = self.offset
+        last_progress = 0
+        try:
+            self.sink.Open(self.offset)
+            try:
+                for chunk in self._chunks():
+                    if self._cancel.is_set():
+                        break
+                    self.sink.Write(chunk)
+                    self.offset += len(chunk)
+                    now = time.time()
+                    if self._on_progress and now - last_progress >= self.PROGRESS_INTERVAL:
+                        last_progress = now
+                        rate = (self.offset - first_offset) / max(now - started, 1e-6)
+                        eta = (total - self.offset) / rate if rate else 0
+                        wx.CallAfter(self._post, self._on_progress, self.offset, total, rate, eta)
+            finally:
+                self.sink.Close()
+        except Exception as e:
+            self.error = e
+        self.done = True
+        if self._on_done:
+            wx.CallAfter(self._post, self._on_done, self)
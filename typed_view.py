@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+import struct
+import bisect
+try:
+    import numpy as np
+except ImportError:
+    np = None  # values are unpacked one by one with struct
+
+# name => struct format character
+TYPES = [
+    ("int8", "b"), ("uint8", "B"),
+    ("int16", "h"), ("uint16", "H"),
+    ("int32", "i"), ("uint32", "I"),
+    ("int64", "q"), ("uint64", "Q"),
+    ("float32", "f"), ("float64", "d"),
+]
+TYPE_CODES = dict(TYPES)
+AGGREGATE_BLOCK = 0x100000  # values summed between two progress calls
+
+
+class StructArray(object):
+    """ the typed values of a buffer unpacked on demand, for when numpy is missing """
+
+    def __init__(self, view, code, big_endian, stride, count):
+        self._view = view
+        self._struct = struct.Struct((">" if big_endian else "<") + code)
+        self._stride = stride
+        self._count = count
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        if not 0 <= index < self._count:
+            raise IndexError(index)
+        return self._struct.unpack_from(self._view, index * self._stride)[0]
+
+    def __iter__(self):
+        for index in range(self._count):
+            yield self[index]
+
+
+def typed_array(view, type_name, big_endian=False, stride=0):
+    """ return the values of type_name in view (a memoryview of bytes) every stride
+    bytes (0 for packed values), a numpy array sharing the memory of view when
+    numpy is installed
+    """
+    code = TYPE_CODES[type_name]
+    itemsize = struct.calcsize(code)
+    stride = stride or itemsize
+    if stride < 0:
+        raise Exception("stride must be positive")
+    count = (len(view) - itemsize) // stride + 1 if len(view) >= itemsize else 0
+
+    if np is None:
+        return StructArray(view, code, big_endian, stride, count)
+    dtype = np.dtype(type_name).newbyteorder(">" if big_endian else "<")
+    return np.ndarray(shape=(count,), dtype=dtype, buffer=view, strides=(stride,))
+
+
+class ChunkedArray(object):
+    """ the typed values of a buffer made of chunks (the pieces of a span), one
+    array per chunk over its memory, a value split over two chunks is copied
+    """
+
+    def __init__(self, segments, itemsize):
+        self.segments = [segment for segment in segments if len(segment)]
+        self.itemsize = itemsize
+        self._firsts = []  # index of the first value of each segment
+        count = 0
+        for segment in self.segments:
+            self._firsts.append(count)
+            count += len(segment)
+        self._count = count
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        if not 0 <= index < self._count:
+            raise IndexError(index)
+        segment = bisect.bisect_right(self._firsts, index) - 1
+        return self.segments[segment][index - self._firsts[segment]]
+
+    def __iter__(self):
+        for segment in self.segments:
+            for value in segment:
+                yield value
+
+
+def typed_chunks(chunks, length, type_name, big_endian=False, stride=0):
+    """ return a ChunkedArray of the values of type_name in the consecutive chunks
+    (memoryviews of bytes, length bytes in all) every stride bytes
+    """
+    code = TYPE_CODES[type_name]
+    itemsize = struct.calcsize(code)
+    stride = stride or itemsize
+    if stride <= 0:
+        raise Exception("stride must be positive")
+    count = (length - itemsize) // stride + 1 if length >= itemsize else 0
+
+    segments = []
+    index = 0  # next value
+    pos = 0  # offset of the chunk
+    tail = b""  # the bytes before pos a split value may start in
+    for chunk in chunks:
+        end = pos + len(chunk)
+        # values started in the previous chunks
+        joined = None
+        while index < count and index * stride < pos and index * stride + itemsize <= end:
+            if joined is None:
+                joined = tail + chunk[:itemsize - 1].tobytes()
+            offset = index * stride - (pos - len(tail))
+            segments.append(typed_array(memoryview(joined[offset:offset + itemsize]), type_name, big_endian))
+            index += 1
+        # values inside the chunk
+        first = index * stride
+        if index < count and first >= pos and first + itemsize <= end:
+            number = min((end - itemsize - first) // stride + 1, count - index)
+            view = chunk[first - pos:first - pos + (number - 1) * stride + itemsize]
+            segments.append(typed_array(view, type_name, big_endian, stride))
+            index += number
+        if itemsize > 1:
+            tail = (tail + chunk[-(itemsize - 1):].tobytes())[-(itemsize - 1):]
+        pos = end
+        if index >= count:
+            break
+    return ChunkedArray(segments, itemsize)
+
+
+def _aggregate(values):
+    """ return (min, max, sum) of a non empty array """
+    if np is not None and hasattr(values, "dtype"):
+        if values.dtype.kind == "f" or values.dtype.itemsize == 8:
+            total = float(values.sum(dtype=np.float64))  # 64 bit integers may overflow
+        else:
+            total = int(values.sum(dtype=np.int64))
+        return values.min().item(), values.max().item(), total
+    low = high = None
+    total = 0
+    for value in values:
+        if low is None or value < low:
+            low = value
+        if high is None or value > high:
+            high = value
+        total += value
+    return low, high, total
+
+
+def aggregates(values, progress=None):
+    """ return (min, max, sum, mean) of the values, None for an empty array,
+    the values are summed a segment of a ChunkedArray or AGGREGATE_BLOCK numpy
+    values at a time, progress(done, count) is called after each
+    """
+    if not len(values):
+        return None
+    segments = values.segments if isinstance(values, ChunkedArray) else [values]
+    low = high = None
+    total = 0
+    done = 0
+    for segment in segments:
+        blocks = [segment]
+        if hasattr(segment, "dtype") and len(segment) > AGGREGATE_BLOCK:
+            blocks = (segment[i:i + AGGREGATE_BLOCK] for i in range(0, len(segment), AGGREGATE_BLOCK))
+        for block in blocks:
+            block_low, block_high, block_total = _aggregate(block)
+            if low is None or block_low < low:
+                low = block_low
+            if high is None or block_high > high:
+                high = block_high
+            total += block_total
+            done += len(block)
+            if progress:
+                progress(done, len(values))
+    return low, high, total, total / float(len(values))
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+import tempfile
+from collections import deque
+from piece_table import Span
+
+
+class SpilledSpan(object):
+    """ bytes of a Span moved to the spill file of a journal """
+
+    def __init__(self, spill_file, offset, length):
+        self._file = spill_file
+        self.offset = offset
+        self.length = length
+
+    def __len__(self):
+        return self.length
+
+    def readinto(self, view):
+        """ fill view (length bytes) from the spill file """
+        self._file.seek(self.offset)
+        pos = 0
+        while pos < self.length:
+            count = self._file.readinto(view[pos:])
+            if not count:
+                raise IOError("undo spill file is truncated")
+            pos += count
+
+
+class UndoJournal(object):
+    """ undo and redo stacks of (action, data) records sharing one memory budget
+
+    Payloads are Span objects (pieces shared with the table) or small bytes.
+    When the bytes only the journal keeps alive go over the budget, the largest
+    spans of the oldest records are written to a temp file, records that still
+    do not fit are dropped, oldest first.
+    """
+    BUDGET = 0x4000000  # 64 MB
+    SPILL_MIN = 0x10000  # smaller spans are not worth a trip to the disk
+
+    def __init__(self, budget=None):
+        self.budget = self.BUDGET if budget is None else budget
+        self._undo = deque()  # [action, data, ram size]
+        self._redo = deque()
+        self._ram = 0
+        self._spill_file = None
+        self._spill_end = 0
+        self._mergeable = False
+
+    @property
+    def CanUndo(self):
+        return bool(self._undo)
+
+    @property
+    def CanRedo(self):
+        return bool(self._redo)
+
+    @property
+    def RamSize(self):
+        return self._ram
+
+    @staticmethod
+    def _ram_size(data):
+        size = 0
+        for item in data:
+            if isinstance(item, Span):
+                size += item.RamSize
+            elif isinstance(item, bytes):
+                size += len(item)
+        return size
+
+    def Record(self, action, data, merge=None):
+        """ record a new edit, the redo stack is dropped
+        merge(action, data, top_action, top_data) may return the data of one record
+        standing for the top record followed by this edit
+        """
+        self._clear(self._redo)
+        if merge is not None and self._mergeable and self._undo:
+            top = self._undo[-1]
+            merged = merge(action, data, top[0], top[1])
+            if merged is not None:
+                self._ram -= top[2]
+                top[1] = merged
+                top[2] = self._ram_size(merged)
+                self._ram += top[2]
+                self._fit()
+                return
+        self._push(self._undo, action, data)
+        self._mergeable = True
+
+    def PushUndo(self, action, data):
+        self._push(self._undo, action, data)
+        self._mergeable = False
+
+    def PushRedo(self, action, data):
+        self._push(self._redo, action, data)
+        self._mergeable = False
+
+    def PopUndo(self):
+        """ return (action, data), raise IndexError when there is nothing to undo """
+        return self._pop(self._undo)
+
+    def PopRedo(self):
+        return self._pop(self._redo)
+
+    def Clear(self):
+        self._clear(self._undo)
+        self._clear(self._redo)
+        if self._spill_file is not None:
+            self._spill_file.close()
+            self._spill_file = None
+            self._spill_end = 0
+
+    def _push(self, stack, action, data):
+        size = self._ram_size(data)
+        stack.append([action, data, size])
+        self._ram += size
+        self._fit()
+
+    def _pop(self, stack):
+        action, data, size = stack.pop()
+        self._ram -= size
+        self._mergeable = False
+        return action, tuple(self._load(item) for item in data)
+
+    def _clear(self, stack):
+        for record in stack:
+            self._ram -= record[2]
+        stack.clear()
+
+    def _load(self, item):
+        """ bring a spilled payload back as a span over one new block """
+        if not isinstance(item, SpilledSpan):
+            return item
+        block = bytearray(len(item))
+        item.readinto(memoryview(block))
+        return Span([(block, 0, len(block))])
+
+    def _spill(self, span):
+        if self._spill_file is None:
+            self._spill_file = tempfile.TemporaryFile(prefix="hexeditor-undo-")
+        offset = self._spill_end
+        self._spill_file.seek(offset)
+        for chunk in span.iter_chunks():
+            self._spill_file.write(chunk)
+        self._spill_end += len(span)
+        return SpilledSpan(self._spill_file, offset, len(span))
+
+    def Spill(self, budget=0):
+        """ move the large payloads of the oldest records to the spill file until
+        the journal keeps no more than budget bytes in memory, no record is dropped
+        """
+        if self._ram <= budget:
+            return
+        # oldest first: the bottom of the undo stack, then of the redo stack
+        for stack in (self._undo, self._redo):
+            for record in stack:
+                if record[2] < self.SPILL_MIN:
+                    continue
+                data = list(record[1])
+                for i, item in enumerate(data):
+                    if isinstance(item, Span) and item.RamSize >= self.SPILL_MIN:
+                        data[i] = self._spill(item)
+                record[1] = tuple(data)
+                self._ram -= record[2]
+                record[2] = self._ram_size(record[1])
+                self._ram += record[2]
+                if self._ram <= budget:
+                    return
+
+    def Detach(self):
+        """ move the payloads that read the original buffer (a file mapping) to the
+        spill file, the mapping can be closed afterwards
+        """
+        for stack in (self._undo, self._redo):
+            for record in stack:
+                data = list(record[1])
+                for i, item in enumerate(data):
+                    if isinstance(item, Span) and any(not isinstance(src, bytearray)
+                                                      for src, start, length in item.pieces):
+                        data[i] = self._spill(item)
+                record[1] = tuple(data)
+                self._ram -= record[2]
+                record[2] = self._ram_size(record[1])
+                self._ram += record[2]
+
+    def _fit(self):
+        if self._ram <= self.budget:
+            return
+        self.Spill(self.budget)
+        # only small records left, forget the oldest edits
+        while self._ram > self.budget and (self._undo or self._redo):
+            stack = self._undo if self._undo else self._redo
+            self._ram -= stack.popleft()[2]